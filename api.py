@@ -0,0 +1,219 @@
+import hashlib
+import json
+from datetime import date, datetime, time
+
+from flask import Blueprint, Response, abort, request
+
+import geo
+from database import read_only
+from facets import requested_filters
+from models import SHOWS_PER_SECTION, db, Artist, Show, Venue
+from pagination import PER_PAGE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+ARTIST_FIELDS = ('id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'image_link', 'facebook_link',
+                 'seeking_venue', 'seeking_description', 'created_at', 'latitude', 'longitude')
+VENUE_FIELDS = ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website', 'image_link',
+                'facebook_link', 'seeking_talent', 'seeking_description', 'created_at', 'latitude', 'longitude')
+SHOW_FIELDS = ('id', 'start_time', 'artist_id', 'artist_name', 'artist_image_link', 'venue_id', 'venue_name',
+               'venue_image_link')
+LISTING_FIELDS = ('id', 'name')
+NEARBY_FIELDS = ('id', 'name', 'city', 'state')
+
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def requested_fields(allowed, default):
+    """Sparse fieldsets: ``?fields=id,name`` picks columns out of ``allowed``."""
+    if not request.args.get('fields'):
+        return default
+
+    fields = tuple(field for field in request.args['fields'].split(',') if field)
+    unknown = set(fields) - set(allowed)
+
+    if unknown:
+        abort(Response(dumps({'error': f'Unknown fields: {", ".join(sorted(unknown))}'}), 400,
+                       mimetype='application/json'))
+
+    return fields
+
+
+def requested_point():
+    """The search origin, from ``?near=San Francisco, CA`` or ``?lat=37.77&lng=-122.42``."""
+    if request.args.get('near'):
+        point = geo.parse_place(request.args['near'])
+
+        if point is None:
+            abort(Response(dumps({'error': f'Unknown place: {request.args["near"]}'}), 400,
+                           mimetype='application/json'))
+
+        return point
+
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        abort(Response(dumps({'error': 'Pass near=City, ST or lat and lng'}), 400, mimetype='application/json'))
+
+    return latitude, longitude
+
+
+def requested_radius(default=None):
+    radius = request.args.get('radius', default=default, type=float)
+
+    if radius is not None and not 0 < radius <= geo.MAX_RADIUS_KM:
+        abort(Response(dumps({'error': f'radius must be between 0 and {geo.MAX_RADIUS_KM} km'}), 400,
+                       mimetype='application/json'))
+
+    return radius
+
+
+def requested_limit(default=geo.NEAREST_LIMIT):
+    return min(max(request.args.get('limit', default=default, type=int), 1), PER_PAGE)
+
+
+def nearby_listing(pairs):
+    return json_response({
+        'data': [{**{field: getattr(row, field) for field in NEARBY_FIELDS}, 'distance_km': round(distance, 1)}
+                 for row, distance in pairs],
+    })
+
+
+def rows_to_dicts(rows, fields):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_response(payload):
+    body = dumps(payload)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body).hexdigest())
+
+    return response.make_conditional(request)
+
+
+def listing(page, fields):
+    return json_response({
+        'data': [{field: getattr(row, field) for field in fields} for row in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor,
+    })
+
+
+def detail(model, entity_id, fields):
+    row = db.session.query(*[getattr(model, field) for field in fields]).filter(model.id == entity_id).first()
+
+    if row is None:
+        abort(Response(dumps({'error': 'Not found'}), 404, mimetype='application/json'))
+
+    return dict(zip(fields, row))
+
+
+def shows_for(now, **filters):
+    counts = Show.counts(now, **filters)
+
+    return {
+        'upcoming_shows': rows_to_dicts(Show.upcoming(now, **filters), SHOW_FIELDS),
+        'upcoming_shows_count': counts.upcoming,
+        'past_shows': rows_to_dicts(Show.past(now, **filters), SHOW_FIELDS),
+        'past_shows_count': counts.past,
+    }
+
+
+@api.route('/artists')
+@read_only
+def artists():
+    fields = requested_fields(LISTING_FIELDS, LISTING_FIELDS)
+    page = Artist.list(after=request.args.get('after'),
+                       before=request.args.get('before'),
+                       criteria=Artist.criteria(**requested_filters(request.args)))
+
+    return listing(page, fields)
+
+
+@api.route('/artists/near')
+@read_only
+def artists_near():
+    latitude, longitude = requested_point()
+
+    return nearby_listing(Artist.nearby(latitude, longitude, requested_radius(), requested_limit()))
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def artist(artist_id):
+    data = detail(Artist, artist_id, requested_fields(ARTIST_FIELDS, ARTIST_FIELDS))
+
+    if request.args.get('shows', 'true') == 'true':
+        data.update(shows_for(datetime.now(), artist_id=artist_id))
+
+    return json_response({'data': data})
+
+
+@api.route('/venues')
+@read_only
+def venues():
+    fields = requested_fields(LISTING_FIELDS, LISTING_FIELDS)
+    page = Venue.list(after=request.args.get('after'),
+                      before=request.args.get('before'),
+                      criteria=Venue.criteria(**requested_filters(request.args)))
+
+    return listing(page, fields)
+
+
+@api.route('/venues/near')
+@read_only
+def venues_near():
+    latitude, longitude = requested_point()
+
+    return nearby_listing(Venue.nearby(latitude, longitude, requested_radius(), requested_limit()))
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def venue(venue_id):
+    data = detail(Venue, venue_id, requested_fields(VENUE_FIELDS, VENUE_FIELDS))
+
+    if request.args.get('shows', 'true') == 'true':
+        data.update(shows_for(datetime.now(), venue_id=venue_id))
+
+    return json_response({'data': data})
+
+
+@api.route('/shows')
+@read_only
+def shows():
+    fields = requested_fields(SHOW_FIELDS, SHOW_FIELDS)
+    page = Show.list(after=request.args.get('after'), before=request.args.get('before'))
+
+    return listing(page, fields)
+
+
+@api.route('/shows/near')
+@read_only
+def shows_near():
+    latitude, longitude = requested_point()
+    shows, distances = Show.nearby(datetime.now(), latitude, longitude,
+                                   requested_radius(geo.DEFAULT_RADIUS_KM), requested_limit(SHOWS_PER_SECTION))
+
+    return json_response({
+        'data': [{**row, 'distance_km': round(distances[row['venue_id']], 1)}
+                 for row in rows_to_dicts(shows, SHOW_FIELDS)],
+    })
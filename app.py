@@ -1,17 +1,34 @@
+import asyncio
 import logging
-import sys
+from datetime import date, datetime, timedelta
 from logging import Formatter, FileHandler
+from uuid import uuid4
 
-import babel
-import dateutil.parser
-from flask import Flask, render_template, request, flash, redirect, url_for
+import click
+from flask import Flask, abort, render_template, request, flash, redirect, url_for, jsonify
 from flask_migrate import Migrate
 from flask_moment import Moment
+from werkzeug.utils import import_string
 
 import config
+from api import api
+from assets import assets, build
+from booking import MAX_SLOT_DAYS, SLOT_ARTISTS_PER_PAGE, booked_show, check_booking, lock_booking, open_slots
+from cache import cache
+from database import read_only, reraise_retryable
 from enums import DaysOfWeek
+from explain import check_view_indexes
+from facets import requested_filters
+from formatting import format_datetime
+from images import pipeline
 from forms import *
-from models import db, Artist, Venue, Show, ArtistSchedule
+from instrumentation import instrumentation
+from models import db, Album, Artist, Venue, Show, ArtistSchedule
+from pagination import paginate
+from search import escape_like
+from seed import SIZES, seed
+from stats import rebuild_show_counts, roll_show_counts
+from templating import compile_templates, configure_templates
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -21,6 +38,11 @@ app = Flask(__name__)
 app.config.from_object(config)
 db.init_app(app)
 moment = Moment(app)
+cache.init_app(app)
+instrumentation.init_app(app)
+pipeline.init_app(app)
+assets.init_app(app)
+app.register_blueprint(api)
 migrate = Migrate(app, db, transaction_per_migration=True)
 migrate.init_app(app, db)
 
@@ -29,75 +51,48 @@ migrate.init_app(app, db)
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
-    else:
-        date = value
-
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    elif format == 'time':
-        format = "HH:mm"
-
-    return babel.dates.format_datetime(date, format, locale='en')
-
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+configure_templates(app)
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 @app.route('/')
+@cache.cached('artists', 'venues')
+@read_only
 def index():
-    recent_artists = Artist.query \
-        .order_by(Artist.created_at.desc(), Artist.id.desc()) \
-        .limit(10) \
-        .all()
-
-    recent_venues = Venue.query \
-        .order_by(Venue.created_at.desc(), Venue.id.desc()) \
-        .limit(10) \
-        .all()
-
     return render_template('pages/home.html',
-                           recent_artists=recent_artists,
-                           recent_venues=recent_venues)
+                           recent_artists=Artist.recent(),
+                           recent_venues=Venue.recent())
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cache.cached('venues')
+@read_only
 def venues():
-    all_venues = Venue.list()
+    filters = requested_filters(request.args)
+    criteria = Venue.criteria(**filters)
+    page = Venue.areas(after=request.args.get('after'), before=request.args.get('before'), criteria=criteria)
 
-    locations = []
-    areas = []
-
-    for venue in all_venues:
-        if (venue.city, venue.state) not in locations:
-            locations.append((venue.city, venue.state))
-
-    for city, state in locations:
-        areas.append({
-            "city": city,
-            "state": state,
-            "venues": list(filter(lambda v: v.city == city, all_venues)),
-        })
-
-    return render_template('pages/venues.html', areas=areas)
+    return render_template('pages/venues.html',
+                           areas=page.items,
+                           page=page,
+                           filters=filters,
+                           facets=Venue.genre_facets(criteria))
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     search_term = request.form.get('search_term')
 
-    data = Venue.search(search_term)
+    data = Venue.search(search_term, criteria=Venue.criteria(**requested_filters(request.values)))
 
     response = {
         'count': len(data),
@@ -110,6 +105,8 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
+@read_only
 def show_venue(venue_id):
     venue = Venue.get(venue_id)
 
@@ -117,26 +114,8 @@ def show_venue(venue_id):
         flash(f"Could not find a venue with the ID #{venue_id}", category='error')
         return redirect(url_for('venues'))
 
-    past_shows_result = list(filter(lambda show: show.start_time <= datetime.now(), venue.shows))
-    upcoming_shows_result = list(filter(lambda show: show.start_time >= datetime.now(), venue.shows))
-    past_shows = []
-    upcoming_shows = []
-
-    for show in past_shows_result:
-        past_shows.append({
-            'artist_id': show.artist.id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': show.start_time
-        })
-
-    for show in upcoming_shows_result:
-        upcoming_shows.append({
-            'artist_id': show.artist.id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': show.start_time
-        })
+    now = datetime.now()
+    counts = Show.counts(now, venue_id=venue_id)
 
     data = {
         'id': venue.id,
@@ -151,10 +130,10 @@ def show_venue(venue_id):
         'seeking_talent': venue.seeking_talent,
         'seeking_description': venue.seeking_description,
         'image_link': venue.image_link,
-        'past_shows': past_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows': upcoming_shows,
-        'upcoming_shows_count': len(upcoming_shows)
+        'past_shows': Show.past(now, venue_id=venue_id),
+        'past_shows_count': counts.past,
+        'upcoming_shows': Show.upcoming(now, venue_id=venue_id),
+        'upcoming_shows_count': counts.upcoming,
     }
 
     return render_template('pages/show_venue.html', venue=data)
@@ -169,6 +148,7 @@ def create_venue_form():
 
 
 @app.route('/venues/create', methods=['POST'])
+@db.transactional
 def create_venue_submission():
     form = VenueForm(request.form, meta={'csrf': False})
 
@@ -192,7 +172,8 @@ def create_venue_submission():
 
             flash('Venue ' + venue.name + ' was successfully listed!')
         except:
-            print(sys.exc_info())
+            reraise_retryable()
+            app.logger.exception('Could not create venue %s', form.name.data)
             flash('An error occurred. Venue ' + form.name.data + ' could not be listed.', category='error')
 
         return render_template('pages/home.html')
@@ -208,12 +189,14 @@ def create_venue_submission():
 
 
 @app.route('/venues/<venue_id>', methods=['DELETE'])
+@db.transactional
 def delete_venue(venue_id):
     try:
         Venue.delete(venue_id)
         flash('Venue #' + venue_id + ' was successfully deleted!')
     except:
-        print(sys.exc_info())
+        reraise_retryable()
+        app.logger.exception('Could not delete venue %s', venue_id)
         flash(f'An error occurred. Could not delete venue with ID #{venue_id}')
 
     return redirect(url_for('index'))
@@ -222,16 +205,26 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cache.cached('artists')
+@read_only
 def artists():
-    data = Artist.list()
-    return render_template('pages/artists.html', artists=data)
+    filters = requested_filters(request.args)
+    criteria = Artist.criteria(**filters)
+    page = Artist.list(after=request.args.get('after'), before=request.args.get('before'), criteria=criteria)
+
+    return render_template('pages/artists.html',
+                           artists=page.items,
+                           page=page,
+                           filters=filters,
+                           facets=Artist.genre_facets(criteria))
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     search_term = request.form.get('search_term')
 
-    data = Artist.search(search_term)
+    data = Artist.search(search_term, criteria=Artist.criteria(**requested_filters(request.values)))
 
     response = {
         'count': len(data),
@@ -243,41 +236,56 @@ def search_artists():
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/artists/open-slots')
+@read_only
+def artist_open_slots():
+    try:
+        first_day = date.fromisoformat(request.args.get('from') or date.today().isoformat())
+        last_day = date.fromisoformat(request.args.get('to') or (first_day + timedelta(days=29)).isoformat())
+    except ValueError:
+        return jsonify({'error': 'from and to must be dates formatted as YYYY-MM-DD'}), 400
+
+    if not 0 <= (last_day - first_day).days < MAX_SLOT_DAYS:
+        return jsonify({'error': f'The date range must span between 1 and {MAX_SLOT_DAYS} days'}), 400
+
+    criteria = Artist.criteria(**requested_filters(request.args))
+
+    if request.args.get('artist_id', type=int):
+        criteria.append(Artist.id == request.args.get('artist_id', type=int))
+    if request.args.get('city'):
+        criteria.append(Artist.city.ilike(escape_like(request.args.get('city')), escape='\\'))
+
+    # A page of artists at a time, so a wide date range stays bounded.
+    page = paginate(db.session.query(Artist.id).filter(*criteria), [Artist.id],
+                    after=request.args.get('after'), per_page=SLOT_ARTISTS_PER_PAGE)
+    slots = open_slots([artist_id for artist_id, in page.items], first_day, last_day)
+
+    return jsonify({
+        'count': len(slots),
+        'slots': [{**slot,
+                   'start_time': slot['start_time'].isoformat(),
+                   'end_time': slot['end_time'].isoformat()} for slot in slots],
+        'next': page.next_cursor,
+    })
+
+
 @app.route('/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
+@read_only
 def show_artist(artist_id):
-    artist = Artist.get(id=artist_id)
+    artist = Artist.get(id=artist_id, profile='detail')
 
     if not artist:
         flash(f"Could not find an artist with the ID #{artist_id}", category='error')
         return redirect(url_for('artists'))
 
-    past_shows_result = list(filter(lambda show: show.start_time <= datetime.now(), artist.shows))
-    upcoming_shows_result = list(filter(lambda show: show.start_time >= datetime.now(), artist.shows))
-    past_shows = []
-    upcoming_shows = []
-
-    for show in past_shows_result:
-        past_shows.append({
-            'venue_id': show.venue.id,
-            'venue_name': show.venue.name,
-            'venue_image_link': show.venue.image_link,
-            'start_time': show.start_time,
-        })
-
-    for show in upcoming_shows_result:
-        upcoming_shows.append({
-            'venue_id': show.venue.id,
-            'venue_name': show.venue.name,
-            'venue_image_link': show.venue.image_link,
-            'start_time': show.start_time,
-        })
+    now = datetime.now()
+    counts = Show.counts(now, artist_id=artist_id)
 
     data = {
         'id': artist.id,
         'name': artist.name,
         'genres': artist.genres,
-        'albums': artist.albums,
-        'albums_count': len(artist.albums),
         'city': artist.city,
         'state': artist.state,
         'phone': artist.phone,
@@ -286,21 +294,39 @@ def show_artist(artist_id):
         'image_link': artist.image_link,
         'facebook_link': artist.facebook_link,
         'website': artist.website,
-        'past_shows': past_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows': upcoming_shows,
-        'upcoming_shows_count': len(upcoming_shows),
+        'past_shows': Show.past(now, artist_id=artist_id),
+        'past_shows_count': counts.past,
+        'upcoming_shows': Show.upcoming(now, artist_id=artist_id),
+        'upcoming_shows_count': counts.upcoming,
         'available_schedules': artist.available_schedules,
     }
 
     return render_template('pages/show_artist.html', artist=data)
 
 
+@app.route('/artists/<int:artist_id>/albums')
+@cache.cached('artist:{artist_id}')
+@read_only
+def artist_albums(artist_id):
+    artist = db.session.query(Artist.id, Artist.name).filter(Artist.id == artist_id).first()
+
+    if artist is None:
+        abort(404)
+
+    albums = Album.catalogue(artist_id)
+
+    # The artist page fetches just the fragment; a followed link gets a whole page.
+    if request.args.get('partial'):
+        return render_template('includes/albums.html', albums=albums)
+
+    return render_template('pages/artist_albums.html', artist=artist, albums=albums)
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.get(id=artist_id)
+    artist = Artist.get(id=artist_id, profile='edit')
 
     form = ArtistForm(obj=artist)
 
@@ -311,12 +337,13 @@ def edit_artist(artist_id):
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@db.transactional
 def edit_artist_submission(artist_id):
     form = ArtistForm(request.form, meta={'csrf': False})
 
     if request.method == 'POST' and form.validate():
         try:
-            artist = Artist.get(id=artist_id)
+            artist = Artist.get(id=artist_id, profile='edit')
 
             artist.name = form.name.data
             artist.city = form.city.data
@@ -339,6 +366,7 @@ def edit_artist_submission(artist_id):
 
             artist.update()
         except:
+            reraise_retryable()
             flash(f'An error occurred. Artist {artist_id} could not be updated.', category='error')
 
         return redirect(url_for('show_artist', artist_id=artist_id))
@@ -350,7 +378,7 @@ def edit_artist_submission(artist_id):
 
         flash(f'Request errors {str(errors)}', category='error')
 
-        return redirect(url_for('edit_artist'))
+        return redirect(url_for('edit_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
@@ -362,6 +390,7 @@ def edit_venue(venue_id):
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@db.transactional
 def edit_venue_submission(venue_id):
     form = VenueForm(request.form, meta={'csrf': False})
 
@@ -383,7 +412,8 @@ def edit_venue_submission(venue_id):
 
             venue.update()
         except:
-            print(sys.exc_info())
+            reraise_retryable()
+            app.logger.exception('Could not update venue %s', venue_id)
 
         return redirect(url_for('show_venue', venue_id=venue_id))
     else:
@@ -408,6 +438,7 @@ def create_artist_form():
 
 
 @app.route('/artists/create', methods=['POST'])
+@db.transactional
 def create_artist_submission():
     form = ArtistForm(request.form, meta={'csrf': False})
 
@@ -442,7 +473,8 @@ def create_artist_submission():
 
             flash('Artist ' + artist.name + ' was successfully listed!')
         except:
-            print(sys.exc_info())
+            reraise_retryable()
+            app.logger.exception('Could not create artist %s', request.form.get('name'))
             flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.', category='error')
 
         return redirect(url_for('index'))
@@ -461,21 +493,12 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cache.cached('shows', 'artists', 'venues')
+@read_only
 def shows():
-    result = Show.list()
-    data = []
+    page = Show.list(after=request.args.get('after'), before=request.args.get('before'))
 
-    for show in result:
-        data.append({
-            'venue_id': show.venue.id,
-            'venue_name': show.venue.name,
-            'artist_id': show.artist.id,
-            'artist_name': show.artist.name,
-            'artist_image_link': show.artist.image_link,
-            'start_time': show.start_time,
-        })
-
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
 
 @app.route('/shows/create')
@@ -484,6 +507,7 @@ def create_shows():
 
 
 @app.route('/shows/create', methods=['POST'])
+@db.transactional
 def create_show_submission():
     form = ShowForm(request.form, meta={'csrf': False})
 
@@ -493,28 +517,41 @@ def create_show_submission():
                 artist_id=form.artist_id.data,
                 venue_id=form.venue_id.data,
                 name=form.name.data,
-                start_time=form.start_time.data
+                start_time=form.start_time.data,
+                idempotency_key=form.idempotency_key.data or None
             )
 
-            start_time = show.start_time.time()
-            day_of_week = show.start_time.strftime('%A')
-
-            artist_schedules = ArtistSchedule.query \
-                .filter(ArtistSchedule.artist_id == show.artist_id,
-                        ArtistSchedule.day_of_week == day_of_week,
-                        ArtistSchedule.start_time <= start_time,
-                        ArtistSchedule.end_time >= start_time) \
-                .all()
+            # Checked and booked under the lock, so parallel submissions cannot
+            # both pass the checks; a resubmitted form finds its earlier show.
+            if not lock_booking(int(show.artist_id), int(show.venue_id)):
+                problems = ['The artist or venue does not exist']
+            else:
+                booked = booked_show(show.idempotency_key)
+
+                if booked is None:
+                    problems = check_booking(int(show.artist_id), int(show.venue_id), show.start_time)
+                elif (booked.artist_id, booked.venue_id, booked.start_time) == \
+                        (int(show.artist_id), int(show.venue_id), show.start_time):
+                    flash('Show was successfully listed!')
+
+                    return redirect(url_for('index'))
+                else:
+                    problems = ['This form already booked a different show. Check the details and submit it again.']
+                    # The key is spent; a fresh one lets the corrected form book its own show.
+                    form.idempotency_key.data = uuid4().hex
+
+            if problems:
+                for problem in problems:
+                    flash(problem, category='error')
 
-            if not artist_schedules:
-                flash('This artist is not available during the specified time', category='error')
                 return render_template('forms/new_show.html', form=form)
 
             show.save()
 
             flash('Show was successfully listed!')
         except:
-            print(sys.exc_info())
+            reraise_retryable()
+            app.logger.exception('Could not create show')
             flash('An error occurred. Show could not be listed', category='error')
 
         return redirect(url_for('index'))
@@ -549,6 +586,112 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+class LazyGroup(click.Group):
+    """A command group imported from ``import_name`` only when the CLI uses it,
+    so the web app never loads the module."""
+
+    def __init__(self, name, import_name, **kwargs):
+        super().__init__(name, **kwargs)
+        self.import_name = import_name
+
+    def list_commands(self, ctx):
+        return import_string(self.import_name).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return import_string(self.import_name).get_command(ctx, name)
+
+
+@app.cli.command('check-indexes')
+def check_indexes():
+    """Fail when a read view issues a query that no index can serve."""
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+
+    failures = check_view_indexes(app, db, artist_id, venue_id)
+
+    for url, relations, statement in failures:
+        click.echo(f'{url}: sequential scan on {", ".join(relations)}\n    {statement}')
+
+    if failures:
+        raise SystemExit(1)
+
+    click.echo('All view queries use an index.')
+
+
+@app.cli.command('assets')
+def assets_command():
+    """Bundle, minify and fingerprint static/css and static/js into static/dist."""
+    for name, hashed in build(app.static_folder).items():
+        click.echo(f'{name} -> {hashed}')
+
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Precompile every template into the bytecode cache (TEMPLATES_PRECOMPILED=true)."""
+    if app.jinja_env.bytecode_cache is None:
+        raise click.UsageError('Set TEMPLATES_PRECOMPILED=true to enable the bytecode cache.')
+
+    click.echo(f'Compiled {compile_templates(app)} templates into {app.config["TEMPLATE_CACHE_DIR"]}')
+
+
+@app.cli.command('thumbnails')
+def thumbnails_command():
+    """Fetch, validate and store thumbnails for every image link in the database."""
+    urls = {url for query in [db.session.query(Artist.image_link),
+                              db.session.query(Venue.image_link),
+                              db.session.query(Album.cover)]
+            for url, in query.distinct() if url}
+
+    stored = asyncio.run(pipeline.process(sorted(urls), tags=['shows', 'artists', 'venues']))
+
+    click.echo(f'Stored {stored} of {len(urls)} images in {app.config["IMAGE_STORE_DIR"]}')
+
+
+@app.cli.command('seed')
+@click.option('--size', type=click.Choice(list(SIZES)), default='small', show_default=True)
+@click.option('--seed', 'random_seed', type=int, default=None, help='Seed for reproducible data.')
+def seed_command(size, random_seed):
+    """Bulk-load a generated dataset of artists, venues, shows and albums."""
+    seed(db.engine, size=size, seed=random_seed, echo=click.echo)
+
+    with db.unit_of_work():
+        rebuild_show_counts(datetime.now())
+
+
+@app.cli.command('refresh-show-counts')
+@click.option('--full', is_flag=True, help='Recompute every counter from the show table.')
+def refresh_show_counts(full):
+    """Move shows that have started from the upcoming to the past counters.
+
+    Run it periodically, e.g. every few minutes from cron. Detail pages stay
+    exact in between; the listing counts lag by at most one period.
+    """
+    now = datetime.now()
+
+    with db.unit_of_work():
+        if full:
+            rebuild_show_counts(now)
+        else:
+            started = roll_show_counts(now)
+
+    if full:
+        cache.invalidate('shows', 'artists', 'venues')
+        click.echo('Rebuilt all show counters.')
+    else:
+        cache.invalidate('artists', 'venues',
+                         *{f'artist:{show.artist_id}' for show in started},
+                         *{f'venue:{show.venue_id}' for show in started})
+        click.echo(f'Moved {len(started)} shows to the past counters.')
+
+
+app.cli.add_command(LazyGroup('benchmark', 'benchmark:cli',
+                              help='Benchmark routes and bookings against BENCHMARK_DATABASE_URL.'))
+
+
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
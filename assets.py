@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from rcssmin import cssmin
+except ImportError:
+    cssmin = None
+
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+
+# Bundles in the order their sources used to be included, relative to static/.
+BUNDLES = {
+    'app.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css',
+                'css/main.quickfix.css', 'css/custom.css'],
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'app.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+# One level below static/, so relative url()s in the stylesheets still resolve.
+DIST = 'dist'
+
+MANIFEST = 'manifest.json'
+
+# Hashed files never change, so browsers may keep them for a year.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def minify(name, source):
+    if name.endswith('.css') and cssmin is not None:
+        return cssmin(source)
+    if name.endswith('.js') and jsmin is not None:
+        return jsmin(source)
+
+    return source
+
+
+def bundle(static_folder, name, sources):
+    parts = []
+
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            parts.append(file.read())
+
+    # A newline and, for scripts, a semicolon keep concatenated files apart.
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+
+    return minify(name, separator.join(parts)).encode()
+
+
+def _write(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def build(static_folder, bundles=BUNDLES):
+    """Write minified, content-hashed bundles and their manifest to static/dist/."""
+    output = os.path.join(static_folder, DIST)
+    os.makedirs(output, exist_ok=True)
+    manifest = {}
+
+    for name, sources in bundles.items():
+        data = bundle(static_folder, name, sources)
+        stem, extension = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        path = os.path.join(output, hashed)
+
+        _write(path, data)
+        _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data))
+
+        manifest[name] = hashed
+
+    _write(os.path.join(output, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    return manifest
+
+
+class Assets:
+    """Serves built bundles through the ``asset_urls()`` template helper.
+
+    Bundles are only built by ``flask assets``. Until a build exists the
+    helper links each source file unbundled. With ``ASSETS_AUTO_BUILD`` an
+    existing build is rebuilt when one of its sources changes.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self._built_at = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.auto_build = app.config.get('ASSETS_AUTO_BUILD', app.debug)
+
+        try:
+            with open(os.path.join(self.static_folder, DIST, MANIFEST)) as file:
+                self.manifest = json.load(file)
+                self._built_at = os.path.getmtime(file.name)
+        except FileNotFoundError:
+            self.manifest = {}
+
+        # More specific than /static/<path:filename>, so it takes these files over.
+        app.add_url_rule(f'{app.static_url_path}/{DIST}/<filename>', 'asset', self.asset_view)
+        app.jinja_env.globals['asset_urls'] = self.urls
+        app.extensions['assets'] = self
+
+    def rebuild(self):
+        self.manifest = build(self.static_folder)
+        self._built_at = os.path.getmtime(os.path.join(self.static_folder, DIST, MANIFEST))
+
+    def _stale(self):
+        return any(os.path.getmtime(os.path.join(self.static_folder, source)) > self._built_at
+                   for sources in BUNDLES.values() for source in sources)
+
+    def urls(self, name):
+        """The ``name`` bundle, or its sources in order while no build has it."""
+        if self.manifest and self.auto_build and self._stale():
+            self.rebuild()
+
+        if name in self.manifest:
+            return [url_for('asset', filename=self.manifest[name])]
+
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def asset_view(self, filename):
+        # Bundles from earlier builds stay servable for pages cached before a deploy.
+        path = safe_join(os.path.join(self.static_folder, DIST), filename)
+
+        if filename == MANIFEST or path is None or not os.path.isfile(path):
+            abort(404)
+
+        accepted = request.accept_encodings
+
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.exists(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_file(path)
+
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+
+        return response
+
+
+assets = Assets()
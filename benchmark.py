@@ -0,0 +1,473 @@
+import gc
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, or_
+
+import config
+from booking import SHOW_DURATION
+from cache import cache
+from enums import DaysOfWeek
+from explain import view_requests
+from images import pipeline
+from models import db, Artist, ArtistSchedule, Show, Venue
+from seed import SIZES, seed
+from stats import rebuild_show_counts
+
+REQUESTS_PER_ROUTE = 50
+
+# A route regresses when its median latency or peak memory grows past the
+# baseline times the threshold, or when it issues more queries than before.
+# Tail percentiles are recorded but too noisy to gate on.
+THRESHOLD = 1.25
+
+# Differences below these are noise on a shared machine.
+MIN_REGRESSION_MS = 2
+MIN_REGRESSION_KB = 64
+
+BOOKING_REQUESTS = 400
+BOOKING_WORKERS = 16
+BOOKING_ARTISTS = 8
+
+# Every slot is requested this many times: by different forms, all but one
+# of which must be turned away, and by resubmissions of the same form.
+REQUESTS_PER_SLOT = 4
+RESUBMIT_RATE = 0.25
+
+VENUE_FORM = {
+    'name': '[V] Benchmark Hall',
+    'city': 'San Francisco',
+    'state': 'CA',
+    'address': '1015 Folsom Street',
+    'phone': '123-123-1234',
+    'genres': ['Jazz'],
+    'seeking_description': 'Benchmark venue',
+}
+
+ARTIST_FORM = {
+    'name': '[A] Benchmark Band',
+    'city': 'San Francisco',
+    'state': 'CA',
+    'phone': '123-123-1234',
+    'genres': ['Jazz'],
+}
+
+
+def benchmark_requests(artist_id, venue_id):
+    """``(name, method, url, data)`` for every route, reads first.
+
+    ``DELETE /venues/<id>`` is left out: it would remove the row the other
+    routes are measured against.
+    """
+    start_time = (date.today() + timedelta(days=1)).isoformat() + ' 20:00:00'
+    routes = [(f'{method} {url}', method, url, data) for method, url, data in view_requests(artist_id, venue_id)]
+
+    return routes + [
+        ('GET /venues/create', 'GET', '/venues/create', None),
+        ('GET /artists/create', 'GET', '/artists/create', None),
+        ('GET /shows/create', 'GET', '/shows/create', None),
+        ('GET /artists/open-slots', 'GET', f'/artists/open-slots?artist_id={artist_id}', None),
+        ('GET /api/v1/artists', 'GET', '/api/v1/artists', None),
+        ('GET /api/v1/artists/<id>', 'GET', f'/api/v1/artists/{artist_id}', None),
+        ('GET /api/v1/venues', 'GET', '/api/v1/venues', None),
+        ('GET /api/v1/venues/<id>', 'GET', f'/api/v1/venues/{venue_id}', None),
+        ('GET /api/v1/shows', 'GET', '/api/v1/shows', None),
+        ('POST /venues/<id>/edit', 'POST', f'/venues/{venue_id}/edit', VENUE_FORM),
+        ('POST /artists/<id>/edit', 'POST', f'/artists/{artist_id}/edit', ARTIST_FORM),
+        ('POST /venues/create', 'POST', '/venues/create', VENUE_FORM),
+        ('POST /artists/create', 'POST', '/artists/create', ARTIST_FORM),
+        ('POST /shows/create', 'POST', '/shows/create',
+         {'artist_id': artist_id, 'venue_id': venue_id, 'name': '[S] Benchmark', 'start_time': start_time}),
+    ]
+
+
+@contextmanager
+def counted_queries(engine):
+    counter = {'queries': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, engine, method, url, data, count=REQUESTS_PER_ROUTE):
+    # The first request warms template and statement caches.
+    client.open(url, method=method, data=data)
+
+    latencies = []
+    queries = []
+
+    # Collection pauses would otherwise land on whichever route triggers them.
+    gc.collect()
+    gc.disable()
+
+    try:
+        for _ in range(count):
+            with counted_queries(engine) as counter:
+                started_at = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+
+            queries.append(counter['queries'])
+    finally:
+        gc.enable()
+
+    # Measured apart from the timings, as tracing slows every allocation down.
+    tracemalloc.start()
+
+    try:
+        client.open(url, method=method, data=data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run(app, db, artist_id, venue_id, count=REQUESTS_PER_ROUTE, echo=print):
+    engine = db.get_engine(app)
+    client = app.test_client()
+    results = {}
+
+    for name, method, url, data in benchmark_requests(artist_id, venue_id):
+        results[name] = measure(client, engine, method, url, data, count)
+        echo(f'{name}: p50 {results[name]["p50_ms"]} ms, p95 {results[name]["p95_ms"]} ms, '
+             f'{results[name]["queries"]} queries, {results[name]["peak_kb"]} KiB')
+
+    return results
+
+
+def regressions(baseline, results, threshold=THRESHOLD):
+    problems = []
+
+    for name, result in results.items():
+        before = baseline.get(name)
+
+        if before is None:
+            continue
+
+        if result['p50_ms'] > before['p50_ms'] * threshold and \
+                result['p50_ms'] - before['p50_ms'] > MIN_REGRESSION_MS:
+            problems.append(f'{name}: p50 {before["p50_ms"]} ms -> {result["p50_ms"]} ms')
+        if result['queries'] > before['queries']:
+            problems.append(f'{name}: {before["queries"]} -> {result["queries"]} queries')
+        if result['peak_kb'] > before['peak_kb'] * threshold and \
+                result['peak_kb'] - before['peak_kb'] > MIN_REGRESSION_KB:
+            problems.append(f'{name}: peak memory {before["peak_kb"]} KiB -> {result["peak_kb"]} KiB')
+
+    return problems
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, dataset, results):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with open(path, 'w') as file:
+        json.dump({'dataset': dataset, 'routes': results}, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def booking_fixtures(count=BOOKING_ARTISTS):
+    """``(artist_id, venue_id)`` pairs of new artists, available around the clock, and their venues."""
+    pairs = []
+
+    with db.unit_of_work():
+        for number in range(count):
+            artist = Artist(name=f'[A] Load Test {number}', city='San Francisco', state='CA', phone='123-123-1234',
+                            genres=['Jazz'], seeking_venue=True)
+            artist.available_schedules = [ArtistSchedule(day_of_week=day, available=True, start_time=datetime.min.time(),
+                                                         end_time=datetime.max.time().replace(microsecond=0))
+                                          for day in DaysOfWeek]
+            artist.save()
+
+            venue = Venue(name=f'[V] Load Test {number}', city='San Francisco', state='CA',
+                          address='1015 Folsom Street', phone='123-123-1234', genres=['Jazz'])
+            venue.save()
+
+            pairs.append((artist.id, venue.id))
+
+    return pairs
+
+
+def remove_booking_fixtures(pairs):
+    """Delete what ``booking_fixtures`` created, with every show booked for it."""
+    artist_ids = [artist_id for artist_id, _ in pairs]
+    venue_ids = [venue_id for _, venue_id in pairs]
+
+    with db.unit_of_work():
+        db.session.query(Show) \
+            .filter(or_(Show.artist_id.in_(artist_ids), Show.venue_id.in_(venue_ids))) \
+            .delete(synchronize_session=False)
+        db.session.query(ArtistSchedule).filter(ArtistSchedule.artist_id.in_(artist_ids)) \
+            .delete(synchronize_session=False)
+        db.session.query(Artist).filter(Artist.id.in_(artist_ids)).delete(synchronize_session=False)
+        db.session.query(Venue).filter(Venue.id.in_(venue_ids)).delete(synchronize_session=False)
+
+
+def booking_forms(pairs, count=BOOKING_REQUESTS, random_seed=1):
+    """Show forms that compete for ``count // REQUESTS_PER_SLOT`` slots, in random order.
+
+    A slot is an artist, its venue and a start time; slots of one artist are
+    back to back, so each can be booked exactly once.
+    """
+    generator = random.Random(random_seed)
+    run_id = uuid4().hex[:8]
+    first_day = date.today() + timedelta(days=1)
+    slots_per_day = (24 * 60 * 60) // int(SHOW_DURATION.total_seconds()) - 1
+    slots = max(1, count // REQUESTS_PER_SLOT)
+    forms = []
+
+    for number in range(count):
+        slot = number % slots
+
+        if number >= slots and generator.random() < RESUBMIT_RATE:
+            forms.append(forms[number - slots])
+            continue
+
+        artist_id, venue_id = pairs[slot % len(pairs)]
+        day, position = divmod(slot // len(pairs), slots_per_day)
+        start_time = datetime.combine(first_day + timedelta(days=day), datetime.min.time()) + position * SHOW_DURATION
+
+        forms.append({
+            'artist_id': artist_id,
+            'venue_id': venue_id,
+            'name': f'[S] Load Test {run_id}',
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'idempotency_key': f'{run_id}-{number}',
+        })
+
+    generator.shuffle(forms)
+
+    return forms, slots
+
+
+def load_test_bookings(app, pairs, count=BOOKING_REQUESTS, workers=BOOKING_WORKERS, random_seed=1):
+    """Post competing show forms from ``workers`` threads, then check what was booked."""
+    forms, slots = booking_forms(pairs, count, random_seed)
+    local = threading.local()
+
+    def post(form):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+
+        return local.client.post('/shows/create', data=form).status_code
+
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(workers) as executor:
+        statuses = list(executor.map(post, forms))
+
+    seconds = time.perf_counter() - started_at
+    booked = defaultdict(list)
+
+    with app.app_context():
+        for artist_id, start_time in db.session.query(Show.artist_id, Show.start_time) \
+                .filter(Show.artist_id.in_([artist_id for artist_id, _ in pairs])):
+            booked[artist_id].append(start_time)
+
+    starts = [sorted(artist_starts) for artist_starts in booked.values()]
+
+    return {
+        'requests': count,
+        'workers': workers,
+        'seconds': round(seconds, 3),
+        'bookings_per_second': round(count / seconds, 1),
+        'slots': slots,
+        'shows': sum(len(artist_starts) for artist_starts in starts),
+        # Shows of one artist less than a show apart, including exact duplicates.
+        'double_booked': sum(1 for artist_starts in starts for first, second in zip(artist_starts, artist_starts[1:])
+                             if second - first < SHOW_DURATION),
+        'errors': sum(1 for status in statuses if status >= 500),
+    }
+
+
+def booking_problems(baseline, result, threshold=THRESHOLD):
+    problems = []
+
+    if result['double_booked']:
+        problems.append(f'{result["double_booked"]} shows overlap another show of the same artist')
+    if result['shows'] != result['slots']:
+        problems.append(f'{result["shows"]} shows booked for {result["slots"]} slots')
+    if result['errors']:
+        problems.append(f'{result["errors"]} requests failed with a server error')
+    if baseline is not None and result['bookings_per_second'] * threshold < baseline['bookings_per_second']:
+        problems.append(f'throughput {baseline["bookings_per_second"]} -> {result["bookings_per_second"]} '
+                        f'requests per second')
+
+    return problems
+
+
+def use_benchmark_database(app):
+    """Point ``db`` at BENCHMARK_DATABASE_URL for the rest of the command; returns its dialect."""
+    url = app.config['BENCHMARK_DATABASE_URL']
+
+    if url == app.config['SQLALCHEMY_DATABASE_URI']:
+        raise click.UsageError('BENCHMARK_DATABASE_URL must not be the app\'s own DATABASE_URL.')
+
+    db.session.remove()
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_BINDS={},
+                      SQLALCHEMY_ENGINE_OPTIONS=config.engine_options(url))
+
+    if db.engine.dialect.name == 'sqlite':
+        db.create_all()
+
+    return db.engine.dialect.name
+
+
+cli = AppGroup('benchmark', help='Benchmark routes and bookings against BENCHMARK_DATABASE_URL.')
+
+
+@cli.command('routes')
+@click.option('--size', type=click.Choice(list(SIZES)), default='small', show_default=True)
+@click.option('--seed', 'random_seed', type=int, default=1, show_default=True)
+@click.option('--requests', 'count', type=int, default=REQUESTS_PER_ROUTE, show_default=True,
+              help='Timed requests per route.')
+@click.option('--baseline', 'baseline_path', default=None,
+              help='Baseline JSON file, benchmarks/<dialect>-<size>.json by default.')
+@click.option('--threshold', type=float, default=THRESHOLD, show_default=True,
+              help='Allowed median latency and memory growth over the baseline.')
+@click.option('--update', is_flag=True, help='Overwrite the baseline with this run.')
+def routes_command(size, random_seed, count, baseline_path, threshold, update):
+    """Time every route against a generated dataset and compare with the baseline.
+
+    Runs against BENCHMARK_DATABASE_URL: a migrated PostgreSQL database, or
+    a sqlite:/// file whose schema is created here. It is seeded first when it
+    holds fewer artists than the dataset size asks for.
+    """
+    app = current_app._get_current_object()
+    dialect = use_benchmark_database(app)
+
+    if db.session.query(db.func.count(Artist.id)).scalar() < SIZES[size]['artists']:
+        seed(db.engine, size=size, seed=random_seed, echo=click.echo)
+
+        with db.unit_of_work():
+            rebuild_show_counts(datetime.now())
+
+    # Measure the views themselves, not the page cache or image fetches.
+    cache.backend = None
+    pipeline.enabled = False
+
+    dataset = {
+        'dialect': dialect,
+        'size': size,
+        'seed': random_seed,
+        'artists': db.session.query(db.func.count(Artist.id)).scalar(),
+        'venues': db.session.query(db.func.count(Venue.id)).scalar(),
+        'shows': db.session.query(db.func.count(Show.id)).scalar(),
+    }
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    db.session.remove()
+
+    results = run(app, db, artist_id, venue_id, count=count, echo=click.echo)
+
+    baseline_path = baseline_path or os.path.join('benchmarks', f'{dialect}-{size}.json')
+    baseline = load_baseline(baseline_path)
+
+    if baseline is None or update:
+        save_baseline(baseline_path, dataset, results)
+        click.echo(f'Baseline written to {baseline_path}')
+        return
+
+    if (baseline['dataset']['dialect'], baseline['dataset']['size']) != (dialect, size):
+        raise click.UsageError(f'{baseline_path} was recorded on a {baseline["dataset"]["size"]} '
+                               f'{baseline["dataset"]["dialect"]} dataset.')
+
+    problems = regressions(baseline['routes'], results, threshold)
+
+    for problem in problems:
+        click.echo(f'Regression: {problem}')
+
+    if problems:
+        raise SystemExit(1)
+
+    click.echo(f'No route regressed past {baseline_path}.')
+
+
+@cli.command('bookings')
+@click.option('--requests', 'count', type=int, default=BOOKING_REQUESTS, show_default=True,
+              help='Show forms to post.')
+@click.option('--workers', type=int, default=BOOKING_WORKERS, show_default=True,
+              help='Threads posting them at once.')
+@click.option('--seed', 'random_seed', type=int, default=1, show_default=True)
+@click.option('--baseline', 'baseline_path', default=None,
+              help='Baseline JSON file, benchmarks/<dialect>-bookings.json by default.')
+@click.option('--threshold', type=float, default=THRESHOLD, show_default=True,
+              help='Allowed throughput drop below the baseline.')
+@click.option('--update', is_flag=True, help='Overwrite the baseline with this run.')
+def bookings_command(count, workers, random_seed, baseline_path, threshold, update):
+    """Post competing show bookings in parallel and check none were double booked.
+
+    Creates its own artists and venues in BENCHMARK_DATABASE_URL, as for
+    ``flask benchmark routes``, and deletes them and their shows afterwards.
+    """
+    app = current_app._get_current_object()
+    dialect = use_benchmark_database(app)
+
+    cache.backend = None
+    pipeline.enabled = False
+
+    pairs = booking_fixtures()
+    db.session.remove()
+
+    try:
+        result = load_test_bookings(app, pairs, count=count, workers=workers, random_seed=random_seed)
+    finally:
+        remove_booking_fixtures(pairs)
+
+    click.echo(f'{result["requests"]} requests from {result["workers"]} workers in {result["seconds"]} s '
+               f'({result["bookings_per_second"]} per second): {result["shows"]} shows for {result["slots"]} slots, '
+               f'{result["double_booked"]} double booked, {result["errors"]} server errors')
+
+    baseline_path = baseline_path or os.path.join('benchmarks', f'{dialect}-bookings.json')
+    baseline = load_baseline(baseline_path)
+    problems = booking_problems(baseline and baseline['routes'], result, threshold)
+
+    for problem in problems:
+        click.echo(f'Failed: {problem}')
+
+    if problems:
+        raise SystemExit(1)
+
+    if baseline is None or update:
+        save_baseline(baseline_path, {'dialect': dialect, 'requests': count, 'workers': workers}, result)
+        click.echo(f'Baseline written to {baseline_path}')
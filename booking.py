@@ -0,0 +1,168 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from enums import DaysOfWeek
+from models import db, Artist, ArtistSchedule, Show, Venue
+
+SHOW_DURATION = timedelta(hours=2)
+
+MAX_SLOT_DAYS = 90
+
+# Artists whose slots one /artists/open-slots response covers.
+SLOT_ARTISTS_PER_PAGE = 50
+
+# datetime.weekday() order; strftime('%A') would depend on the process locale.
+WEEKDAYS = [DaysOfWeek.MONDAY, DaysOfWeek.TUESDAY, DaysOfWeek.WEDNESDAY, DaysOfWeek.THURSDAY,
+            DaysOfWeek.FRIDAY, DaysOfWeek.SATURDAY, DaysOfWeek.SUNDAY]
+
+
+def day_of_week(moment):
+    return WEEKDAYS[moment.weekday()]
+
+
+def is_available(artist_id, start_time, duration=SHOW_DURATION):
+    end_time = start_time + duration
+
+    if end_time.date() != start_time.date():
+        return False
+
+    return db.session.query(ArtistSchedule.id) \
+        .filter(ArtistSchedule.artist_id == artist_id,
+                ArtistSchedule.day_of_week == day_of_week(start_time),
+                ArtistSchedule.available.is_(True),
+                ArtistSchedule.start_time <= start_time.time(),
+                ArtistSchedule.end_time >= end_time.time()) \
+        .first() is not None
+
+
+def find_conflict(column, entity_id, start_time, duration=SHOW_DURATION):
+    # Every show lasts SHOW_DURATION, so an overlapping show starts within one
+    # duration either side; that keeps this a range scan on (fk, start_time).
+    return db.session.query(Show.id) \
+        .filter(column == entity_id,
+                Show.start_time > start_time - SHOW_DURATION,
+                Show.start_time < start_time + duration) \
+        .first()
+
+
+def lock_booking(artist_id, venue_id):
+    """Hold off other bookings of this artist and venue until the transaction ends.
+
+    Returns whether both exist. PostgreSQL locks the two rows, artist first so
+    that two bookings never wait on each other. SQLite has no row locks, so an
+    empty write takes its database-wide write lock instead.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        db.session.execute(Artist.__table__.update().values(id=Artist.id).where(db.false()))
+
+    artist = db.session.query(Artist.id).filter(Artist.id == artist_id).with_for_update().first()
+    venue = db.session.query(Venue.id).filter(Venue.id == venue_id).with_for_update().first()
+
+    return artist is not None and venue is not None
+
+
+def booked_show(idempotency_key):
+    """The show an earlier submission of the same form created, if any."""
+    if not idempotency_key:
+        return None
+
+    return db.session.query(Show.id, Show.artist_id, Show.venue_id, Show.start_time) \
+        .filter(Show.idempotency_key == idempotency_key) \
+        .first()
+
+
+def check_booking(artist_id, venue_id, start_time, duration=SHOW_DURATION):
+    """Return the reasons why the show cannot be booked, if any."""
+    problems = []
+
+    if not is_available(artist_id, start_time, duration):
+        problems.append('This artist is not available during the specified time')
+
+    if find_conflict(Show.artist_id, artist_id, start_time, duration):
+        problems.append('This artist is already booked for another show at that time')
+
+    if find_conflict(Show.venue_id, venue_id, start_time, duration):
+        problems.append('This venue already hosts another show at that time')
+
+    return problems
+
+
+def free_windows(window_start, window_end, starts, duration=SHOW_DURATION):
+    """Gaps of at least ``duration`` left in a window by shows starting at ``starts``."""
+    low = bisect_right(starts, window_start - duration)
+    high = bisect_left(starts, window_end)
+    cursor = window_start
+    gaps = []
+
+    for start_time in starts[low:high]:
+        if start_time - cursor >= duration:
+            gaps.append((cursor, start_time))
+
+        cursor = max(cursor, start_time + duration)
+
+    if window_end - cursor >= duration:
+        gaps.append((cursor, window_end))
+
+    return gaps
+
+
+def open_slots(artist_ids, first_day, last_day, duration=SHOW_DURATION):
+    """Free slots of the artists ``artist_ids`` between two dates, inclusive.
+
+    Whatever the number of artists and days, this runs three queries: names,
+    weekly schedules and the shows in range. Slots are then cut out of each
+    day's window with bisection over the artist's sorted show start times.
+    """
+    if not artist_ids:
+        return []
+
+    range_start = datetime.combine(first_day, datetime.min.time())
+    range_end = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+
+    names = dict(db.session.query(Artist.id, Artist.name).filter(Artist.id.in_(artist_ids)))
+
+    windows = defaultdict(dict)
+
+    for artist_id, day, start_time, end_time in db.session \
+            .query(ArtistSchedule.artist_id, ArtistSchedule.day_of_week,
+                   ArtistSchedule.start_time, ArtistSchedule.end_time) \
+            .filter(ArtistSchedule.artist_id.in_(artist_ids),
+                    ArtistSchedule.available.is_(True),
+                    ArtistSchedule.start_time.isnot(None),
+                    ArtistSchedule.end_time.isnot(None)):
+        windows[artist_id][day] = (start_time, end_time)
+
+    shows = db.session.query(Show.artist_id, Show.start_time) \
+        .filter(Show.artist_id.in_(artist_ids),
+                Show.start_time > range_start - duration,
+                Show.start_time < range_end) \
+        .order_by(Show.artist_id, Show.start_time)
+    booked = {artist_id: [start_time for _, start_time in rows]
+              for artist_id, rows in groupby(shows, key=lambda row: row[0])}
+
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    slots = []
+
+    for artist_id in sorted(windows):
+        starts = booked.get(artist_id, [])
+
+        for day in days:
+            window = windows[artist_id].get(day_of_week(day))
+
+            if window is None:
+                continue
+
+            for start_time, end_time in free_windows(datetime.combine(day, window[0]),
+                                                     datetime.combine(day, window[1]),
+                                                     starts,
+                                                     duration):
+                slots.append({
+                    'artist_id': artist_id,
+                    'artist_name': names.get(artist_id),
+                    'start_time': start_time,
+                    'end_time': end_time,
+                })
+
+    return slots
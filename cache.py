@@ -0,0 +1,174 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+
+class LRUBackend:
+    """Bounded in-process cache with per-entry expiry."""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Shared cache for several workers; needs the optional ``redis`` package."""
+
+    def __init__(self, url, ttl=60, prefix='fyyur:'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+
+        return value.decode() if value is not None else None
+
+    def get_many(self, keys):
+        return [value.decode() if value is not None else None
+                for value in self._client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    """Caches rendered pages under entity tags.
+
+    Every tag has a version token stored in the backend, and the token is part
+    of the key of each page rendered under that tag. Invalidating a tag only
+    replaces its token, so stale pages become unreachable on every worker
+    sharing the backend and age out on their own.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config.get('CACHE_TTL', 60)
+        redis_url = app.config.get('CACHE_REDIS_URL')
+
+        if app.config.get('CACHE_BACKEND') == 'redis' and redis_url:
+            try:
+                self.backend = RedisBackend(redis_url, ttl=ttl)
+            except ImportError:
+                app.logger.warning('redis is not installed, falling back to the in-process cache')
+
+        if self.backend is None:
+            self.backend = LRUBackend(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024), ttl=ttl)
+
+        if not app.config.get('CACHE_ENABLED', True):
+            self.backend = None
+
+        app.extensions['response_cache'] = self
+
+    def _tag_versions(self, tags):
+        keys = [f'tag:{tag}' for tag in tags]
+        versions = self.backend.get_many(keys)
+
+        for i, version in enumerate(versions):
+            if version is None:
+                versions[i] = uuid.uuid4().hex
+                self.backend.set(keys[i], versions[i], ttl=0)
+
+        return versions
+
+    def invalidate(self, *tags):
+        if self.backend is None:
+            return
+
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', uuid.uuid4().hex, ttl=0)
+
+    def cached(self, *tags):
+        """Cache a GET view's rendered body under ``tags``.
+
+        Tags may contain ``{placeholders}`` filled from the view arguments,
+        e.g. ``'venue:{venue_id}'``.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pages carrying flashed messages are personal and never cached.
+                if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                view_tags = [tag.format(**kwargs) for tag in tags]
+                versions = self._tag_versions(view_tags)
+                key = 'page:' + request.full_path + ':' + '.'.join(versions)
+
+                body = self.backend.get(key)
+
+                if body is None:
+                    body = view(*args, **kwargs)
+
+                    if isinstance(body, str):
+                        self.backend.set(key, body)
+
+                return body
+
+            return wrapper
+
+        return decorator
+
+
+cache = ResponseCache()
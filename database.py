@@ -0,0 +1,117 @@
+import sys
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.exc import DBAPIError
+
+REPLICA_BIND = 'replica'
+
+TRANSACTION_RETRIES = 3
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+
+class RoutingSession(SignallingSession):
+    """Sends reads from ``read_only`` views to the replica bind, when configured."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if has_app_context() and g.get('read_only') and REPLICA_BIND in (self.app.config['SQLALCHEMY_BINDS'] or {}):
+            return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _limit_request_statements(session, transaction, connection):
+    timeout = session.app.config.get('DB_STATEMENT_TIMEOUT')
+
+    # SET LOCAL ends with the transaction, so the pooled connection goes back unbounded.
+    if timeout and has_request_context() and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _run_after_commit(session):
+    for callback in session.info.pop('after_commit', []):
+        callback()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_after_commit(session):
+    session.info.pop('after_commit', None)
+
+
+def after_commit(session, callback):
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+def is_retryable(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) in RETRYABLE_SQLSTATES
+
+
+def reraise_retryable():
+    """Call first in the ``except:`` block of a transactional view, so that
+    serialization failures and deadlocks still reach ``transactional``."""
+    error = sys.exc_info()[1]
+
+    if is_retryable(error):
+        raise error
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    @contextmanager
+    def unit_of_work(self):
+        try:
+            yield self.session
+            self.session.commit()
+        except:
+            self.session.rollback()
+
+            raise
+
+    def transactional(self, view):
+        """Run ``view`` as one unit of work, committed once when it returns.
+
+        Serialization failures and deadlocks roll the transaction back and run
+        the view again, up to ``TRANSACTION_RETRIES`` times.
+        """
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            flashes = list(flask_session.get('_flashes', []))
+
+            for attempt in range(1, TRANSACTION_RETRIES + 1):
+                try:
+                    with self.unit_of_work():
+                        return view(*args, **kwargs)
+                except DBAPIError as error:
+                    if attempt == TRANSACTION_RETRIES or not is_retryable(error):
+                        raise
+
+                    # Drop whatever the failed attempt flashed before running the view again.
+                    if flashes:
+                        flask_session['_flashes'] = list(flashes)
+                    else:
+                        flask_session.pop('_flashes', None)
+
+        return wrapper
+
+
+def read_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.read_only = False
+
+    return wrapper
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def captured_selects(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def sequential_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+
+    for child in plan.get('Plans', []):
+        yield from sequential_scans(child)
+
+
+def explain(engine, statement, parameters):
+    # With sequential scans disabled the planner only falls back to one when
+    # no index can serve the query, regardless of how small the tables are.
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+
+    return plan[0]['Plan']
+
+
+def view_requests(artist_id, venue_id):
+    return [
+        ('GET', '/', None),
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', f'/venues/{venue_id}', None),
+        ('GET', f'/artists/{artist_id}', None),
+        ('GET', f'/artists/{artist_id}/albums', None),
+        ('GET', f'/venues/{venue_id}/edit', None),
+        ('GET', f'/artists/{artist_id}/edit', None),
+        ('POST', '/venues/search', {'search_term': 'music'}),
+        ('POST', '/artists/search', {'search_term': 'music'}),
+        ('GET', '/api/v1/venues/near?near=New+York,+NY&radius=100', None),
+        ('GET', '/api/v1/artists/near?near=New+York,+NY', None),
+        ('GET', '/api/v1/shows/near?near=New+York,+NY', None),
+    ]
+
+
+def check_view_indexes(app, db, artist_id, venue_id):
+    """Replay every read view and return the queries whose plan needs a Seq Scan."""
+    engine = db.get_engine(app)
+    client = app.test_client()
+    failures = []
+
+    for method, url, data in view_requests(artist_id, venue_id):
+        with captured_selects(engine) as statements:
+            client.open(url, method=method, data=data)
+
+        for statement, parameters in statements:
+            relations = sorted(set(sequential_scans(explain(engine, statement, parameters))))
+
+            if relations:
+                failures.append((url, relations, statement))
+
+    return failures
@@ -0,0 +1,70 @@
+from sqlalchemy import and_, cast, exists, func, or_, true
+
+from enums import Genre
+
+GENRE_VALUES = {genre.value for genre in Genre}
+
+GENRE_NAMES = {genre.name: genre.value for genre in Genre}
+
+
+def _elements(session, column):
+    """``column`` unnested into a table to join or filter on, and its genre column."""
+    if session.get_bind().dialect.name == 'postgresql':
+        elements = func.unnest(column).table_valued('genre').render_derived()
+
+        return elements, elements.c.genre
+
+    # SQLite keeps the arrays as JSON.
+    elements = func.json_each(column).table_valued('value')
+
+    return elements, elements.c.value
+
+
+def requested_filters(args):
+    """Genre and state filters from ``?genre=Jazz&genre=Blues&match=any&state=NY``.
+
+    Genres may be given by value or by enum name; unknown ones are dropped.
+    """
+    genres = []
+
+    for genre in args.getlist('genre'):
+        genre = GENRE_NAMES.get(genre, genre)
+
+        if genre in GENRE_VALUES and genre not in genres:
+            genres.append(genre)
+
+    return {
+        'genres': genres,
+        'match': 'any' if args.get('match') == 'any' else 'all',
+        'state': args.get('state') or None,
+    }
+
+
+def genre_criteria(session, column, genres, match='all'):
+    """Rows tagged with all (``@>``) or any (``&&``) of ``genres``; both use the GIN index."""
+    if not genres:
+        return []
+
+    if session.get_bind().dialect.name == 'postgresql':
+        return [column.op('@>' if match == 'all' else '&&')(cast(genres, column.type))]
+
+    checks = []
+
+    for genre in genres:
+        elements, element = _elements(session, column)
+        checks.append(exists().select_from(elements).where(element == genre))
+
+    return [and_(*checks) if match == 'all' else or_(*checks)]
+
+
+def genre_counts(session, model, criteria):
+    """``(genre, count)`` over the rows matching ``criteria``, in one query."""
+    elements, genre = _elements(session, model.genres)
+
+    return session.query(genre.label('genre'), func.count().label('count')) \
+        .select_from(model) \
+        .join(elements, true()) \
+        .filter(*criteria) \
+        .group_by(genre) \
+        .order_by(func.count().desc(), genre) \
+        .all()
@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+    'time': "HH:mm",
+}
+
+FORMATTED_VALUES_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=None)
+def compiled_pattern(format):
+    return parse_pattern(FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def locale(name):
+    return Locale.parse(name)
+
+
+@lru_cache(maxsize=FORMATTED_VALUES_CACHE_SIZE)
+def format_datetime(value, format='medium', locale_name='en'):
+    """Jinja ``datetime`` filter; accepts datetimes, dates, times and ISO strings.
+
+    CLDR patterns are parsed once per format and formatted values are
+    memoised, since the same show times repeat across a rendered page.
+    """
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+
+    return compiled_pattern(format).apply(value, locale(locale_name))
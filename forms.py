@@ -1,10 +1,11 @@
 from datetime import timedelta, datetime
+from uuid import uuid4
 
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, URL, Regexp, Optional
 
-from enums import Genre
+from enums import Genre, State
 
 
 class ShowForm(Form):
@@ -14,6 +15,7 @@ class ShowForm(Form):
     start_time = DateTimeField('start_time',
                                validators=[DataRequired()],
                                default=datetime.today() + timedelta(days=1))
+    idempotency_key = HiddenField('idempotency_key', default=lambda: uuid4().hex)
 
 
 class VenueForm(Form):
@@ -21,65 +23,13 @@ class VenueForm(Form):
     city = StringField('city', validators=[DataRequired()])
     state = SelectField('state',
                         validators=[DataRequired()],
-                        choices=[
-                            ('AL', 'AL'),
-                            ('AK', 'AK'),
-                            ('AZ', 'AZ'),
-                            ('AR', 'AR'),
-                            ('CA', 'CA'),
-                            ('CO', 'CO'),
-                            ('CT', 'CT'),
-                            ('DE', 'DE'),
-                            ('DC', 'DC'),
-                            ('FL', 'FL'),
-                            ('GA', 'GA'),
-                            ('HI', 'HI'),
-                            ('ID', 'ID'),
-                            ('IL', 'IL'),
-                            ('IN', 'IN'),
-                            ('IA', 'IA'),
-                            ('KS', 'KS'),
-                            ('KY', 'KY'),
-                            ('LA', 'LA'),
-                            ('ME', 'ME'),
-                            ('MT', 'MT'),
-                            ('NE', 'NE'),
-                            ('NV', 'NV'),
-                            ('NH', 'NH'),
-                            ('NJ', 'NJ'),
-                            ('NM', 'NM'),
-                            ('NY', 'NY'),
-                            ('NC', 'NC'),
-                            ('ND', 'ND'),
-                            ('OH', 'OH'),
-                            ('OK', 'OK'),
-                            ('OR', 'OR'),
-                            ('MD', 'MD'),
-                            ('MA', 'MA'),
-                            ('MI', 'MI'),
-                            ('MN', 'MN'),
-                            ('MS', 'MS'),
-                            ('MO', 'MO'),
-                            ('PA', 'PA'),
-                            ('RI', 'RI'),
-                            ('SC', 'SC'),
-                            ('SD', 'SD'),
-                            ('TN', 'TN'),
-                            ('TX', 'TX'),
-                            ('UT', 'UT'),
-                            ('VT', 'VT'),
-                            ('VA', 'VA'),
-                            ('WA', 'WA'),
-                            ('WV', 'WV'),
-                            ('WI', 'WI'),
-                            ('WY', 'WY'),
-                        ])
+                        choices=State.options())
     address = StringField('address', validators=[DataRequired()])
     phone = StringField('phone', validators=[DataRequired(), Regexp(r'\d{3}-\d{3}-\d{4}')])
     image_link = StringField('image_link')
     genres = SelectMultipleField('genres',
                                  validators=[DataRequired()],
-                                 choices=Genre.options())
+                                 choices=Genre.value_options())
     facebook_link = StringField('facebook_link', validators=[Optional(), URL()])
     website_link = StringField('website_link')
     seeking_talent = BooleanField('seeking_talent')
@@ -91,64 +41,12 @@ class ArtistForm(Form):
     city = StringField('city', validators=[DataRequired()])
     state = SelectField('state',
                         validators=[DataRequired()],
-                        choices=[
-                            ('AL', 'AL'),
-                            ('AK', 'AK'),
-                            ('AZ', 'AZ'),
-                            ('AR', 'AR'),
-                            ('CA', 'CA'),
-                            ('CO', 'CO'),
-                            ('CT', 'CT'),
-                            ('DE', 'DE'),
-                            ('DC', 'DC'),
-                            ('FL', 'FL'),
-                            ('GA', 'GA'),
-                            ('HI', 'HI'),
-                            ('ID', 'ID'),
-                            ('IL', 'IL'),
-                            ('IN', 'IN'),
-                            ('IA', 'IA'),
-                            ('KS', 'KS'),
-                            ('KY', 'KY'),
-                            ('LA', 'LA'),
-                            ('ME', 'ME'),
-                            ('MT', 'MT'),
-                            ('NE', 'NE'),
-                            ('NV', 'NV'),
-                            ('NH', 'NH'),
-                            ('NJ', 'NJ'),
-                            ('NM', 'NM'),
-                            ('NY', 'NY'),
-                            ('NC', 'NC'),
-                            ('ND', 'ND'),
-                            ('OH', 'OH'),
-                            ('OK', 'OK'),
-                            ('OR', 'OR'),
-                            ('MD', 'MD'),
-                            ('MA', 'MA'),
-                            ('MI', 'MI'),
-                            ('MN', 'MN'),
-                            ('MS', 'MS'),
-                            ('MO', 'MO'),
-                            ('PA', 'PA'),
-                            ('RI', 'RI'),
-                            ('SC', 'SC'),
-                            ('SD', 'SD'),
-                            ('TN', 'TN'),
-                            ('TX', 'TX'),
-                            ('UT', 'UT'),
-                            ('VT', 'VT'),
-                            ('VA', 'VA'),
-                            ('WA', 'WA'),
-                            ('WV', 'WV'),
-                            ('WI', 'WI'),
-                            ('WY', 'WY'),
-                        ])
+                        choices=State.options())
     phone = StringField('phone', validators=[DataRequired(), Regexp(r'\d{3}-\d{3}-\d{4}')])
     image_link = StringField('image_link')
     genres = SelectMultipleField('genres',
                                  validators=[DataRequired()],
-                                 choices=Genre.options())
+                                 choices=Genre.value_options())
     facebook_link = StringField('facebook_link', validators=[Optional(), URL()])
     website_link = StringField('website_link')
     seeking_venue = BooleanField('seeking_venue')
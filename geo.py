@@ -0,0 +1,236 @@
+import csv
+import math
+import os
+
+from sqlalchemy import and_, event, or_
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# About 5 m across; searches match on shorter prefixes of the stored hash.
+GEOHASH_PRECISION = 9
+
+EARTH_RADIUS_KM = 6371.0088
+
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
+NEAREST_LIMIT = 10
+
+_gazetteer = None
+
+
+def gazetteer():
+    """``{(city, state): (latitude, longitude)}``; a blank city holds the state's centre."""
+    global _gazetteer
+
+    if _gazetteer is None:
+        with open(GAZETTEER, newline='', encoding='utf-8') as file:
+            _gazetteer = {(row['city'].lower(), row['state']): (float(row['latitude']), float(row['longitude']))
+                          for row in csv.DictReader(file)}
+
+    return _gazetteer
+
+
+def cities():
+    """``(city, state, latitude, longitude)`` for every city in the gazetteer."""
+    with open(GAZETTEER, newline='', encoding='utf-8') as file:
+        return [(row['city'], row['state'], float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(file) if row['city']]
+
+
+def geocode(city, state):
+    """Coordinates of ``city``, falling back to the centre of ``state``; ``None`` if neither is known."""
+    places = gazetteer()
+    city = (city or '').strip().lower()
+
+    return places.get((city, state)) or places.get(('', state))
+
+
+def parse_place(text):
+    """Coordinates of ``'San Francisco, CA'`` or of a bare state code."""
+    city, _, state = (text or '').rpartition(',')
+
+    return geocode(city, state.strip().upper())
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    bounds = [[-90.0, 90.0], [-180.0, 180.0]]
+    value = (latitude, longitude)
+    chars = []
+    bit = 0
+    index = 0
+    # Geohashes interleave bits, starting with longitude.
+    axis = 1
+
+    while len(chars) < precision:
+        low, high = bounds[axis]
+        middle = (low + high) / 2
+
+        if value[axis] >= middle:
+            index = index * 2 + 1
+            bounds[axis][0] = middle
+        else:
+            index = index * 2
+            bounds[axis][1] = middle
+
+        axis = 1 - axis
+        bit += 1
+
+        if bit == 5:
+            chars.append(BASE32[index])
+            bit = 0
+            index = 0
+
+    return ''.join(chars)
+
+
+def _cell_degrees(precision):
+    bits = 5 * precision
+
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _reach_km(precision, latitude):
+    """How far from any point the 3x3 block of cells around it is guaranteed to reach."""
+    height, width = _cell_degrees(precision)
+    # Cells narrow towards the poles, so measure at their far edge.
+    far_latitude = min(90.0, abs(latitude) + height)
+
+    return min(height * 110.574, width * 111.320 * math.cos(math.radians(far_latitude)))
+
+
+def _precision_for(radius_km, latitude):
+    """The finest precision whose cells reach ``radius_km``.
+
+    Never coarser than one character, so a search always filters on the
+    geohash index; only near the poles does that fall short of the radius.
+    """
+    for precision in range(GEOHASH_PRECISION, 1, -1):
+        if _reach_km(precision, latitude) >= radius_km:
+            return precision
+
+    return 1
+
+
+def cells(latitude, longitude, precision):
+    """The cell around the point and its eight neighbours."""
+    height, width = _cell_degrees(precision)
+    # Neighbours are found from the centre of the cell, not the point itself.
+    centre_latitude = (math.floor((latitude + 90) / height) + 0.5) * height - 90
+    centre_longitude = (math.floor((longitude + 180) / width) + 0.5) * width - 180
+    found = set()
+
+    for row in (-1, 0, 1):
+        for column in (-1, 0, 1):
+            neighbour_latitude = centre_latitude + row * height
+
+            if -90 < neighbour_latitude < 90:
+                neighbour_longitude = (centre_longitude + column * width + 180) % 360 - 180
+                found.add(encode(neighbour_latitude, neighbour_longitude, precision))
+
+    return found
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    latitude, longitude, other_latitude, other_longitude = \
+        map(math.radians, (latitude, longitude, other_latitude, other_longitude))
+    a = math.sin((other_latitude - latitude) / 2) ** 2 + \
+        math.cos(latitude) * math.cos(other_latitude) * math.sin((other_longitude - longitude) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def within_cells(column, latitude, longitude, precision):
+    """Prefix matches on the geohash index for the cells around the point."""
+    return or_(*[column.like(cell + '%') for cell in sorted(cells(latitude, longitude, precision))])
+
+
+def _within_km(model, latitude, longitude, radius_km):
+    """A latitude/longitude box holding every point within ``radius_km``."""
+    angle = radius_km / EARTH_RADIUS_KM
+    height = math.degrees(angle)
+    criteria = [model.latitude.between(latitude - height, latitude + height)]
+    # From the haversine formula: sin(angle / 2) >= sqrt(cos(lat1) * cos(lat2)) * sin(dlng / 2).
+    narrowest = math.cos(math.radians(latitude)) * math.cos(math.radians(min(90.0, abs(latitude) + height)))
+    ratio = math.sin(angle / 2) / math.sqrt(narrowest) if narrowest > 0 else math.inf
+
+    if ratio < 1:
+        width = math.degrees(2 * math.asin(ratio))
+
+        if -180 <= longitude - width and longitude + width <= 180:
+            criteria.append(model.longitude.between(longitude - width, longitude + width))
+
+    return and_(*criteria)
+
+
+def _candidates(query, model, latitude, longitude, precision, limit=None):
+    query = query.filter(model.geohash.isnot(None), within_cells(model.geohash, latitude, longitude, precision))
+
+    if limit is not None:
+        # Rank by equirectangular distance, which needs no trigonometry in SQL,
+        # to find how far the nearest ``limit`` rows reach. That approximation
+        # can misorder rows, so everything within the exact distance is then
+        # read and sorted below.
+        north = model.latitude - latitude
+        east = (model.longitude - longitude) * math.cos(math.radians(latitude))
+        rows = query.order_by(north * north + east * east, model.id).limit(limit).all()
+
+        if len(rows) == limit:
+            furthest = max(distance_km(latitude, longitude, row.latitude, row.longitude) for row in rows)
+            rows = query.filter(_within_km(model, latitude, longitude, furthest)).all()
+    else:
+        rows = query.all()
+
+    pairs = sorted(((row, distance_km(latitude, longitude, row.latitude, row.longitude)) for row in rows),
+                   key=lambda pair: (pair[1], pair[0].id))
+
+    return pairs[:limit]
+
+
+def nearby(query, model, latitude, longitude, radius_km=None, limit=NEAREST_LIMIT):
+    """``(row, distance_km)`` pairs from ``query``, nearest first.
+
+    ``query`` must select the model's ``id``, ``latitude`` and ``longitude``.
+    With a radius, one range scan per neighbouring geohash cell finds the
+    candidates. Without one, the search widens a cell size at a time until
+    ``limit`` rows are known to be the nearest, up to ``MAX_RADIUS_KM`` away.
+    Either way the database ranks the candidates, so only rows about as
+    near as the ``limit``-th one are read.
+    """
+    if radius_km is not None:
+        pairs = _candidates(query, model, latitude, longitude, _precision_for(radius_km, latitude), limit)
+
+        return [pair for pair in pairs if pair[1] <= radius_km]
+
+    widest = _precision_for(MAX_RADIUS_KM, latitude)
+
+    for precision in range(_precision_for(DEFAULT_RADIUS_KM / 10, latitude), widest - 1, -1):
+        pairs = _candidates(query, model, latitude, longitude, precision, limit)
+        reach = min(_reach_km(precision, latitude), MAX_RADIUS_KM)
+        # Only rows inside the reach are certain to be nearer than any outside the cells.
+        certain = [pair for pair in pairs if pair[1] <= reach]
+
+        if len(certain) >= limit or precision == widest:
+            return certain
+
+
+def locate(target):
+    coordinates = geocode(target.city, target.state)
+
+    if coordinates is None:
+        target.latitude = target.longitude = target.geohash = None
+    else:
+        target.latitude, target.longitude = coordinates
+        target.geohash = encode(*coordinates)
+
+
+def track(model):
+    """Geocode ``model`` rows from their city and state whenever they are saved."""
+
+    @event.listens_for(model, 'before_insert')
+    @event.listens_for(model, 'before_update')
+    def geocode_row(mapper, connection, target):
+        locate(target)
+
+    return model
@@ -0,0 +1,358 @@
+import asyncio
+import functools
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from flask import abort, send_file, url_for
+
+from cache import cache
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_SIZE = (400, 400)
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+SCHEMES = {'http', 'https'}
+
+# Failed links are retried after this long, in case the failure was transient.
+FAILURE_TTL = 60 * 60
+
+# How long a link without a stored thumbnail is remembered before the refs
+# directory is checked again, e.g. for a thumbnail another worker stored.
+MISSING_TTL = 60
+
+# Stored thumbnails never change, so browsers may keep them for a year.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+]
+
+log = logging.getLogger('fyyur.images')
+
+
+def _public_address(host, port, allowed_hosts=frozenset()):
+    """The first address of ``host`` on the public internet; private, loopback,
+    link-local and other special addresses are refused unless ``host`` is in
+    ``allowed_hosts``."""
+    for family, type, proto, _, address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        ip = ipaddress.ip_address(address[0].split('%')[0])
+
+        if (not ip.is_global or ip.is_multicast) and host not in allowed_hosts:
+            raise ValueError(f'{host} resolves to the non-public address {ip}')
+
+        return family, type, proto, address
+
+    raise ValueError(f'{host} does not resolve')
+
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None,
+                              allowed_hosts=frozenset()):
+    # Resolved and checked at connect time, so redirects and DNS changes
+    # between a check and the download cannot reach an internal host.
+    family, type, proto, address = _public_address(*address, allowed_hosts)
+    sock = socket.socket(family, type, proto)
+
+    try:
+        if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(timeout)
+
+        sock.connect(address)
+    except:
+        sock.close()
+
+        raise
+
+    return sock
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, allowed_hosts=frozenset(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = functools.partial(_create_public_connection, allowed_hosts=allowed_hosts)
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, allowed_hosts=frozenset(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = functools.partial(_create_public_connection, allowed_hosts=allowed_hosts)
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, allowed_hosts=frozenset()):
+        super().__init__()
+        self.allowed_hosts = allowed_hosts
+
+    def http_open(self, request):
+        return self.do_open(functools.partial(_PublicHTTPConnection, allowed_hosts=self.allowed_hosts), request)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, allowed_hosts=frozenset()):
+        super().__init__()
+        self.allowed_hosts = allowed_hosts
+
+    def https_open(self, request):
+        return self.do_open(functools.partial(_PublicHTTPSConnection, allowed_hosts=self.allowed_hosts), request,
+                            context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, request, fp, code, message, headers, new_url):
+        if urlsplit(new_url).scheme not in SCHEMES:
+            raise ValueError(f'redirected to {new_url}')
+
+        return super().redirect_request(request, fp, code, message, headers, new_url)
+
+
+def _opener(allowed_hosts=frozenset()):
+    """urllib without file://, ftp:// or proxies, connecting to public hosts and ``allowed_hosts`` only."""
+    opener = urllib.request.OpenerDirector()
+
+    for handler in [_PublicHTTPHandler(allowed_hosts), _PublicHTTPSHandler(allowed_hosts), _RedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()]:
+        opener.add_handler(handler)
+
+    return opener
+
+
+def sniff(data):
+    for signature, mimetype in SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+
+    return None
+
+
+def thumbnail(data, size=THUMBNAIL_SIZE):
+    """Shrink an image to fit ``size``; stored as is when Pillow is missing."""
+    if Image is None:
+        return data
+
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail(size)
+    output = io.BytesIO()
+    image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True)
+
+    return output.getvalue()
+
+
+class ImageStore:
+    """Content-addressed files, plus refs from source URLs to their thumbnail."""
+
+    def __init__(self, root):
+        self.root = root
+        self._refs = {}
+        self._missing = {}
+
+    def path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def _ref_path(self, url):
+        return os.path.join(self.root, 'refs', hashlib.sha256(url.encode()).hexdigest())
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{threading.get_ident()}.tmp'
+
+        with open(partial, 'wb') as file:
+            file.write(data)
+
+        os.replace(partial, path)
+
+    def put(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+
+        if not os.path.exists(self.path(digest)):
+            self._write(self.path(digest), data)
+
+        self._write(self._ref_path(url), digest.encode())
+        self._refs[url] = digest
+        self._missing.pop(url, None)
+
+        return digest
+
+    def lookup(self, url):
+        digest = self._refs.get(url)
+
+        if digest is None:
+            if self._missing.get(url, 0) > time.monotonic():
+                return None
+
+            try:
+                with open(self._ref_path(url), 'rb') as file:
+                    digest = self._refs[url] = file.read().decode()
+            except FileNotFoundError:
+                self._missing[url] = time.monotonic() + MISSING_TTL
+
+                return None
+
+        return digest
+
+    def missing(self, url):
+        """Whether ``url`` was looked up without a thumbnail in the last ``MISSING_TTL`` seconds."""
+        return self._missing.get(url, 0) > time.monotonic()
+
+
+class ImagePipeline:
+    """Validates image links and stores their thumbnails, off the request path.
+
+    An asyncio loop on a background thread runs up to ``workers`` fetches at
+    once. Downloads use urllib in a thread pool and only reach public http and
+    https hosts: links are user input, so private, loopback and link-local
+    addresses are refused, including after redirects. Hosts listed in
+    ``IMAGE_ALLOWED_HOSTS`` are exempt, e.g. a local stand-in under test.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self._loop = None
+        self._loop_pid = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        # url -> when it may be tried again
+        self._failed = {}
+        self._opener = _opener()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = ImageStore(app.config['IMAGE_STORE_DIR'])
+        self.enabled = app.config.get('IMAGE_PIPELINE_ENABLED', True)
+        self.workers = app.config.get('IMAGE_WORKERS', 4)
+        self.timeout = app.config.get('IMAGE_FETCH_TIMEOUT', 10)
+        self._opener = _opener(frozenset(app.config.get('IMAGE_ALLOWED_HOSTS', ())))
+
+        app.add_url_rule('/img/<digest>', 'image', self.image_view)
+        app.jinja_env.filters['thumbnail'] = self.thumbnail_url
+        app.extensions['image_pipeline'] = self
+
+    def image_view(self, digest):
+        if len(digest) != 64 or not all(char in '0123456789abcdef' for char in digest):
+            abort(404)
+
+        path = self.store.path(digest)
+
+        if not os.path.exists(path):
+            abort(404)
+
+        with open(path, 'rb') as file:
+            mimetype = sniff(file.read(16)) or 'application/octet-stream'
+
+        response = send_file(path, mimetype=mimetype, etag=digest, conditional=True)
+        response.headers['Cache-Control'] = IMMUTABLE
+
+        return response
+
+    def thumbnail_url(self, url):
+        """Template filter: the stored thumbnail of ``url``, or ``url`` until there is one."""
+        if not url or self.store is None:
+            return url
+
+        # Only a lookup that went to the refs directory queues the link;
+        # cached misses are already pending, failed or being processed.
+        was_missing = self.store.missing(url)
+        digest = self.store.lookup(url)
+
+        if digest is None:
+            if not was_missing:
+                self.submit([url])
+
+            return url
+
+        return url_for('image', digest=digest)
+
+    def submit(self, urls, tags=()):
+        """Queue ``urls`` for validation; pages under ``tags`` are invalidated once stored."""
+        if not self.enabled or self.store is None:
+            return
+
+        now = time.monotonic()
+
+        with self._lock:
+            urls = [url for url in set(urls)
+                    if url and url not in self._pending and self._failed.get(url, 0) <= now]
+            self._pending.update(urls)
+
+        if urls:
+            asyncio.run_coroutine_threadsafe(self.process(urls, tags), self._background_loop())
+
+    def _background_loop(self):
+        with self._lock:
+            # Started on first use, so each forked worker gets its own thread.
+            if self._loop_pid != os.getpid():
+                self._loop_pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(ThreadPoolExecutor(self.workers, thread_name_prefix='images'))
+                threading.Thread(target=self._loop.run_forever, name='image-pipeline', daemon=True).start()
+
+            return self._loop
+
+    def fetch(self, url):
+        if urlsplit(url).scheme not in SCHEMES:
+            raise ValueError('only http and https links are fetched')
+
+        request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-image-pipeline'})
+
+        with self._opener.open(request, timeout=self.timeout) as response:
+            if int(response.headers.get('Content-Length') or 0) > MAX_IMAGE_BYTES:
+                raise ValueError(f'larger than {MAX_IMAGE_BYTES} bytes')
+
+            data = response.read(MAX_IMAGE_BYTES + 1)
+
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ValueError(f'larger than {MAX_IMAGE_BYTES} bytes')
+        if sniff(data) is None:
+            raise ValueError('not a JPEG, PNG, GIF or WebP image')
+
+        return thumbnail(data)
+
+    async def _process_one(self, url, semaphore):
+        loop = asyncio.get_running_loop()
+
+        async with semaphore:
+            try:
+                data = await loop.run_in_executor(None, self.fetch, url)
+                self.store.put(url, data)
+
+                return True
+            except Exception as error:
+                self._failed[url] = time.monotonic() + FAILURE_TTL
+                log.warning('Invalid image link %s: %s', url, error)
+
+                return False
+            finally:
+                with self._lock:
+                    self._pending.discard(url)
+
+    async def process(self, urls, tags=()):
+        """Fetch, validate and store ``urls``; returns how many were stored."""
+        semaphore = asyncio.Semaphore(self.workers)
+        results = await asyncio.gather(*[self._process_one(url, semaphore) for url in urls])
+
+        if any(results) and tags:
+            cache.invalidate(*tags)
+
+        return sum(results)
+
+
+pipeline = ImagePipeline()
@@ -0,0 +1,197 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request, request_finished, request_started, \
+    before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds, in seconds, of the request latency histogram.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_query_log = logging.getLogger('fyyur.slow_query')
+
+
+class RequestTimings:
+    __slots__ = ('started_at', 'queries', 'sql', 'render', 'render_started_at')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.render_started_at = None
+
+
+class Metrics:
+    """Per-endpoint counters and latency histogram, in Prometheus text format.
+
+    Each worker keeps its own numbers; Prometheus sums them across scrapes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._queries = defaultdict(int)
+        self._sql = defaultdict(float)
+        self._render = defaultdict(float)
+        self._latency = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+
+    def observe(self, endpoint, timings, latency):
+        with self._lock:
+            self._requests[endpoint] += 1
+            self._queries[endpoint] += timings.queries
+            self._sql[endpoint] += timings.sql
+            self._render[endpoint] += timings.render
+            self._latency[endpoint] += latency
+
+            buckets = self._buckets[endpoint]
+
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    buckets[i] += 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+
+            for name, kind, help_text, values in [
+                ('fyyur_requests_total', 'counter', 'Requests served.', self._requests),
+                ('fyyur_sql_queries_total', 'counter', 'SQL statements executed.', self._queries),
+                ('fyyur_sql_seconds_total', 'counter', 'Time spent executing SQL.', self._sql),
+                ('fyyur_render_seconds_total', 'counter', 'Time spent rendering templates.', self._render),
+            ]:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(f'{name}{{endpoint="{endpoint}"}} {value}' for endpoint, value in sorted(values.items()))
+
+            lines.append('# HELP fyyur_request_seconds Request latency.')
+            lines.append('# TYPE fyyur_request_seconds histogram')
+
+            for endpoint, buckets in sorted(self._buckets.items()):
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'fyyur_request_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+
+                lines.append(f'fyyur_request_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                             f'{self._requests[endpoint]}')
+                lines.append(f'fyyur_request_seconds_sum{{endpoint="{endpoint}"}} {self._latency[endpoint]}')
+                lines.append(f'fyyur_request_seconds_count{{endpoint="{endpoint}"}} {self._requests[endpoint]}')
+
+            return '\n'.join(lines) + '\n'
+
+
+def _timings():
+    return g.get('request_timings') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+    timings = _timings()
+
+    if timings is not None:
+        timings.queries += 1
+        timings.sql += elapsed
+
+    instrumentation.query_executed(statement, elapsed)
+
+
+class Instrumentation:
+    """Records query count, SQL time, render time and latency per request.
+
+    The totals go to ``/metrics`` and to a ``Server-Timing`` header, and
+    statements slower than ``SLOW_QUERY_MS`` are logged as JSON lines.
+    """
+
+    def __init__(self, app=None):
+        self.metrics = Metrics()
+        self.slow_query_seconds = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('INSTRUMENTATION_ENABLED', True):
+            return
+
+        slow_query_ms = app.config.get('SLOW_QUERY_MS')
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms is not None else None
+        self.server_timing = app.config.get('SERVER_TIMING_ENABLED', True)
+
+        # The records are already JSON lines; a deployment that configures
+        # its own handler for the logger keeps it.
+        if not slow_query_log.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            slow_query_log.addHandler(handler)
+            slow_query_log.setLevel(logging.WARNING)
+            slow_query_log.propagate = False
+
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+
+        if app.config.get('METRICS_ENABLED', True):
+            app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        app.extensions['instrumentation'] = self
+
+    def metrics_view(self):
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    def query_executed(self, statement, elapsed):
+        if self.slow_query_seconds is None or elapsed < self.slow_query_seconds:
+            return
+
+        slow_query_log.warning(json.dumps({
+            'event': 'slow_query',
+            'duration_ms': round(elapsed * 1000, 3),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'path': request.path if has_request_context() else None,
+            'statement': ' '.join(statement.split()),
+        }))
+
+    def _request_started(self, sender, **extra):
+        g.request_timings = RequestTimings()
+
+    def _before_render(self, sender, template, context, **extra):
+        timings = _timings()
+
+        if timings is not None:
+            timings.render_started_at = time.perf_counter()
+
+    def _rendered(self, sender, template, context, **extra):
+        timings = _timings()
+
+        if timings is not None and timings.render_started_at is not None:
+            timings.render += time.perf_counter() - timings.render_started_at
+            timings.render_started_at = None
+
+    def _request_finished(self, sender, response, **extra):
+        timings = _timings()
+
+        if timings is None or request.endpoint == 'metrics':
+            return
+
+        latency = time.perf_counter() - timings.started_at
+        self.metrics.observe(request.endpoint or 'unmatched', timings, latency)
+
+        if self.server_timing:
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={timings.sql * 1000:.2f};desc="{timings.queries} queries"',
+                f'render;dur={timings.render * 1000:.2f}',
+                f'total;dur={latency * 1000:.2f}',
+            ])
+
+
+instrumentation = Instrumentation()
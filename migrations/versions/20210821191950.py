@@ -8,13 +8,10 @@ Create Date: 2021-08-21 19:19:50.405843
 import random
 from datetime import datetime, timedelta
 
+import sqlalchemy as sa
 from alembic import op
 from faker import Faker
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
 
-from app import Artist, Venue, Show, ArtistSchedule
-from config import SQLALCHEMY_DATABASE_URI
 from enums import DaysOfWeek
 
 # revision identifiers, used by Alembic.
@@ -24,7 +21,51 @@ branch_labels = None
 depends_on = 'e4ec480e9e4a'
 
 fake = Faker()
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
+
+# Rows are inserted through plain tables frozen at this revision: the models
+# have since grown columns that do not exist yet. Artists and venues need a
+# primary key for their inserted ids to be returned.
+metadata = sa.MetaData()
+
+artist_table = sa.Table('artist', metadata,
+                        sa.Column('id', sa.Integer, primary_key=True),
+                        sa.Column('name', sa.String),
+                        sa.Column('city', sa.String),
+                        sa.Column('state', sa.String),
+                        sa.Column('phone', sa.String),
+                        sa.Column('genres', sa.ARRAY(sa.String).with_variant(sa.JSON, 'sqlite')),
+                        sa.Column('website', sa.String),
+                        sa.Column('image_link', sa.String),
+                        sa.Column('facebook_link', sa.String),
+                        sa.Column('seeking_venue', sa.Boolean),
+                        sa.Column('seeking_description', sa.String))
+
+artist_schedule_table = sa.table('artist_schedule',
+                                 sa.column('artist_id', sa.Integer),
+                                 sa.column('day_of_week', sa.String),
+                                 sa.column('available', sa.Boolean),
+                                 sa.column('start_time', sa.Time),
+                                 sa.column('end_time', sa.Time))
+
+venue_table = sa.Table('venue', metadata,
+                       sa.Column('id', sa.Integer, primary_key=True),
+                       sa.Column('name', sa.String),
+                       sa.Column('address', sa.String),
+                       sa.Column('city', sa.String),
+                       sa.Column('facebook_link', sa.String),
+                       sa.Column('genres', sa.ARRAY(sa.String).with_variant(sa.JSON, 'sqlite')),
+                       sa.Column('image_link', sa.String),
+                       sa.Column('phone', sa.String),
+                       sa.Column('seeking_description', sa.String),
+                       sa.Column('seeking_talent', sa.Boolean),
+                       sa.Column('state', sa.String),
+                       sa.Column('website', sa.String))
+
+show_table = sa.table('show',
+                      sa.column('name', sa.String),
+                      sa.column('artist_id', sa.Integer),
+                      sa.column('venue_id', sa.Integer),
+                      sa.column('start_time', sa.DateTime))
 
 artists = []
 venues = []
@@ -106,74 +147,73 @@ states = [
 ]
 
 
+def insert(table, values):
+    return op.get_bind().execute(table.insert().values(**values)).inserted_primary_key[0]
+
+
 def upgrade():
-    with Session(engine) as session:
-        #  Generate artists
-        for artist_id in range(100):
-            seeking_venue = fake.boolean()
-
-            artist = Artist(
-                name='[A] ' + fake.name(),
-                city=fake.city(),
-                state=random.choice(states),
-                phone=fake.numerify('###-###-####'),
-                genres=random.choices(genres, k=random.choice([1, 2, 3])),
-                website=fake.hostname(),
-                image_link='https://source.unsplash.com/300x200/?singer',
-                facebook_link='https://www.facebook.com/' + fake.user_name(),
-                seeking_venue=seeking_venue,
-                seeking_description=fake.sentence() if seeking_venue else None
-            )
-
-            # Generate the artist's available schedules
-            for day in DaysOfWeek:
-                available = fake.boolean()
-
-                min_datetime = datetime.now().replace(hour=9, minute=0, second=0)
-                max_datetime = datetime.now().replace(hour=23, minute=59, second=59)
-
-                start_date = fake.date_time_between_dates(min_datetime, max_datetime)
-                end_date = fake.date_time_between_dates(start_date, max_datetime)
-
-                artist.available_schedules.append(
-                    ArtistSchedule(
-                        artist_id=artist.id,
-                        day_of_week=day.value,
-                        available=available,
-                        start_time=start_date.time().replace(second=0) if available else None,
-                        end_time=end_date.time().replace(second=0) if available else None,
-                    )
-                )
-
-            artists.append(artist)
-            session.add(artist)
-
-        for venue_id in range(30):
-            venue = Venue(
-                name='[V] ' + fake.company(),
-                address=fake.address(),
-                city=fake.city(),
-                facebook_link='https://www.facebook.com/' + fake.user_name(),
-                genres=random.choices(genres, k=random.choice([1, 2, 3])),
-                image_link='https://source.unsplash.com/400x600/?concert',
-                phone=fake.phone_number(),
-                seeking_description=fake.catch_phrase(),
-                seeking_talent=fake.boolean(),
-                state=random.choice(states),
-                website=fake.hostname()
-            )
-            venues.append(venue)
-            session.add(venue)
-
-        for show_id in range(300):
-            session.add(Show(
-                name='[S] ' + fake.text(),
-                artist=random.choice(artists),
-                venue=random.choice(venues),
-                start_time=datetime.today() + timedelta(days=random.randrange(-100, 100))
-            ))
-
-        session.commit()
+    schedules = []
+
+    #  Generate artists
+    for number in range(100):
+        seeking_venue = fake.boolean()
+
+        artist_id = insert(artist_table, {
+            'name': '[A] ' + fake.name(),
+            'city': fake.city(),
+            'state': random.choice(states),
+            'phone': fake.numerify('###-###-####'),
+            'genres': random.choices(genres, k=random.choice([1, 2, 3])),
+            'website': fake.hostname(),
+            'image_link': 'https://source.unsplash.com/300x200/?singer',
+            'facebook_link': 'https://www.facebook.com/' + fake.user_name(),
+            'seeking_venue': seeking_venue,
+            'seeking_description': fake.sentence() if seeking_venue else None,
+        })
+
+        # Generate the artist's available schedules
+        for day in DaysOfWeek:
+            available = fake.boolean()
+
+            min_datetime = datetime.now().replace(hour=9, minute=0, second=0)
+            max_datetime = datetime.now().replace(hour=23, minute=59, second=59)
+
+            start_date = fake.date_time_between_dates(min_datetime, max_datetime)
+            end_date = fake.date_time_between_dates(start_date, max_datetime)
+
+            schedules.append({
+                'artist_id': artist_id,
+                'day_of_week': day.value,
+                'available': available,
+                'start_time': start_date.time().replace(second=0) if available else None,
+                'end_time': end_date.time().replace(second=0) if available else None,
+            })
+
+        artists.append(artist_id)
+
+    op.bulk_insert(artist_schedule_table, schedules)
+
+    for number in range(30):
+        venues.append(insert(venue_table, {
+            'name': '[V] ' + fake.company(),
+            'address': fake.address(),
+            'city': fake.city(),
+            'facebook_link': 'https://www.facebook.com/' + fake.user_name(),
+            'genres': random.choices(genres, k=random.choice([1, 2, 3])),
+            'image_link': 'https://source.unsplash.com/400x600/?concert',
+            'phone': fake.phone_number(),
+            'seeking_description': fake.catch_phrase(),
+            'seeking_talent': fake.boolean(),
+            'state': random.choice(states),
+            'website': fake.hostname(),
+        }))
+
+    op.bulk_insert(show_table, [{
+        'name': '[S] ' + fake.text(),
+        'artist_id': random.choice(artists),
+        'venue_id': random.choice(venues),
+        'start_time': datetime.today() + timedelta(days=random.randrange(-100, 100)),
+    } for show_id in range(300)])
 
 
 def downgrade():
@@ -7,13 +7,9 @@ Create Date: 2021-08-22 00:14:54.247966
 """
 import random
 
+import sqlalchemy as sa
 from alembic import op
 from faker import Faker
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
-
-from config import SQLALCHEMY_DATABASE_URI
-from models import Album, Song
 
 # revision identifiers, used by Alembic.
 revision = 'a58cebf54a72'
@@ -22,26 +18,39 @@ branch_labels = None
 depends_on = '49625c006a91'
 
 fake = Faker()
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
+
+# Plain tables frozen at this revision, rather than the current models.
+metadata = sa.MetaData()
+
+album_table = sa.Table('album', metadata,
+                       sa.Column('id', sa.Integer, primary_key=True),
+                       sa.Column('artist_id', sa.Integer),
+                       sa.Column('title', sa.String),
+                       sa.Column('cover', sa.String))
+
+song_table = sa.table('song',
+                      sa.column('album_id', sa.Integer),
+                      sa.column('title', sa.String))
 
 
 def upgrade():
-    with Session(engine) as session:
-        for i in range(300):
-            album = Album(
-                artist_id=random.choice(list(range(1, 100))),
-                title=fake.text(max_nb_chars=20),
-                cover='https://source.unsplash.com/400x600/?music',
-            )
-
-            for j in range(random.choice(list(range(5, 15)))):
-                album.songs.append(Song(
-                    album_id=album.id,
-                    title=fake.text(max_nb_chars=20),
-                ))
-
-            session.add(album)
-            session.commit()
+    bind = op.get_bind()
+    songs = []
+
+    for i in range(300):
+        album_id = bind.execute(album_table.insert().values(
+            artist_id=random.choice(list(range(1, 100))),
+            title=fake.text(max_nb_chars=20),
+            cover='https://source.unsplash.com/400x600/?music',
+        )).inserted_primary_key[0]
+
+        for j in range(random.choice(list(range(5, 15)))):
+            songs.append({
+                'album_id': album_id,
+                'title': fake.text(max_nb_chars=20),
+            })
+
+    op.bulk_insert(song_table, songs)
 
 
 def downgrade():
@@ -0,0 +1,61 @@
+"""Add full-text and trigram search indexes
+
+Revision ID: 3f9c2b7d1e45
+Revises: a58cebf54a72
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2b7d1e45'
+down_revision = 'a58cebf54a72'
+branch_labels = None
+depends_on = None
+
+tables = ['artist', 'venue']
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+
+    for table in tables:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+        op.execute(f"""
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+                    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update();
+        """)
+        op.execute(f'UPDATE {table} SET name = name;')
+
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin')
+
+        for column in ['name', 'city', 'state']:
+            op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in tables:
+        for column in ['name', 'city', 'state']:
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};')
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update();')
+        op.drop_column(table, 'search_vector')
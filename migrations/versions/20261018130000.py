@@ -0,0 +1,38 @@
+"""Add indexes for foreign key, listing and time predicates
+
+Revision ID: 7b1d4e8a2c90
+Revises: 3f9c2b7d1e45
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7b1d4e8a2c90'
+down_revision = '3f9c2b7d1e45'
+branch_labels = None
+depends_on = None
+
+# artist_schedule(artist_id, day_of_week) is already covered by its unique constraint.
+indexes = [
+    ('ix_show_start_time_id', 'show', ['start_time', 'id']),
+    ('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time', 'id']),
+    ('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time', 'id']),
+    ('ix_album_artist_id', 'album', ['artist_id']),
+    ('ix_song_album_id', 'song', ['album_id']),
+    ('ix_artist_name_id', 'artist', ['name', 'id']),
+    ('ix_artist_created_at_id', 'artist', [sa.text('created_at DESC'), sa.text('id DESC')]),
+    ('ix_venue_created_at_id', 'venue', [sa.text('created_at DESC'), sa.text('id DESC')]),
+    ('ix_venue_state_city_name_id', 'venue', ['state', 'city', 'name', 'id']),
+]
+
+
+def upgrade():
+    for name, table, columns in indexes:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(indexes):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,54 @@
+"""Add materialised upcoming and past show counters
+
+Revision ID: c5e2a9f4b817
+Revises: 7b1d4e8a2c90
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2a9f4b817'
+down_revision = '7b1d4e8a2c90'
+branch_labels = None
+depends_on = None
+
+indexes = [
+    ('ix_show_uncounted_start_time', ['start_time']),
+    ('ix_show_uncounted_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_show_uncounted_venue_id_start_time', ['venue_id', 'start_time']),
+]
+
+
+def upgrade():
+    for table in ['artist', 'venue']:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.add_column('show', sa.Column('counted_as_past', sa.Boolean(), nullable=False, server_default='false'))
+
+    op.execute('UPDATE show SET counted_as_past = start_time < LOCALTIMESTAMP')
+
+    for table in ['artist', 'venue']:
+        op.execute(f'''
+            UPDATE {table}
+            SET upcoming_shows_count = (SELECT count(*) FROM show
+                                        WHERE show.{table}_id = {table}.id AND NOT show.counted_as_past),
+                past_shows_count = (SELECT count(*) FROM show
+                                    WHERE show.{table}_id = {table}.id AND show.counted_as_past)
+        ''')
+
+    for name, columns in indexes:
+        op.create_index(name, 'show', columns, postgresql_where=sa.text('NOT counted_as_past'))
+
+
+def downgrade():
+    for name, columns in reversed(indexes):
+        op.drop_index(name, table_name='show')
+
+    op.drop_column('show', 'counted_as_past')
+
+    for table in ['venue', 'artist']:
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,46 @@
+"""Store genres by value and index them for faceting
+
+Revision ID: 9d3f6b1c2e70
+Revises: c5e2a9f4b817
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+from enums import Genre
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6b1c2e70'
+down_revision = 'c5e2a9f4b817'
+branch_labels = None
+depends_on = None
+
+indexes = [
+    ('ix_artist_genres', 'artist', ['genres'], {'postgresql_using': 'gin'}),
+    ('ix_venue_genres', 'venue', ['genres'], {'postgresql_using': 'gin'}),
+    ('ix_artist_state', 'artist', ['state'], {}),
+]
+
+
+def upgrade():
+    # The forms used to store enum names (e.g. HIP_HOP) while the seeds
+    # stored values (Hip-Hop); filters and facets need one spelling.
+    names = ', '.join(f"('{genre.name}', '{genre.value}')" for genre in Genre)
+
+    for table in ['artist', 'venue']:
+        op.execute(f'''
+            UPDATE {table}
+            SET genres = ARRAY(SELECT coalesce(names.value, element)
+                               FROM unnest({table}.genres) WITH ORDINALITY AS elements(element, position)
+                               LEFT JOIN (VALUES {names}) AS names(name, value) ON names.name = element
+                               ORDER BY position)
+            WHERE genres && ARRAY[{', '.join(f"'{genre.name}'" for genre in Genre)}]::varchar[]
+        ''')
+
+    for name, table, columns, options in indexes:
+        op.create_index(name, table, columns, **options)
+
+
+def downgrade():
+    for name, table, columns, options in reversed(indexes):
+        op.drop_index(name, table_name=table)
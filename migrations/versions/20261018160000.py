@@ -0,0 +1,52 @@
+"""Geocode artists and venues and index them by geohash
+
+Revision ID: 4e8a1d7c3b52
+Revises: 9d3f6b1c2e70
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+import geo
+
+# revision identifiers, used by Alembic.
+revision = '4e8a1d7c3b52'
+down_revision = '9d3f6b1c2e70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    for table in ['artist', 'venue']:
+        op.add_column(table, sa.Column('latitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('longitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('geohash', sa.String(length=12), nullable=True))
+
+        # The gazetteer lives in the project, not the database, so rows are
+        # geocoded here rather than in SQL.
+        located = []
+
+        for id, city, state in bind.execute(sa.text(f'SELECT id, city, state FROM {table}')):
+            coordinates = geo.geocode(city, state)
+
+            if coordinates is not None:
+                located.append({'id': id, 'latitude': coordinates[0], 'longitude': coordinates[1],
+                                'geohash': geo.encode(*coordinates)})
+
+        if located:
+            bind.execute(sa.text(f'UPDATE {table} SET latitude = :latitude, longitude = :longitude, '
+                                 f'geohash = :geohash WHERE id = :id'), located)
+
+        op.create_index(f'ix_{table}_geohash', table, ['geohash'],
+                        postgresql_ops={'geohash': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    for table in ['venue', 'artist']:
+        op.drop_index(f'ix_{table}_geohash', table_name=table)
+        op.drop_column(table, 'geohash')
+        op.drop_column(table, 'longitude')
+        op.drop_column(table, 'latitude')
@@ -0,0 +1,25 @@
+"""Add an idempotency key to shows
+
+Revision ID: b71f0c9e4a36
+Revises: 4e8a1d7c3b52
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b71f0c9e4a36'
+down_revision = '4e8a1d7c3b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_show_idempotency_key', 'show', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_show_idempotency_key', table_name='show')
+    op.drop_column('show', 'idempotency_key')
@@ -1,22 +1,139 @@
-import sys
+import logging
+from datetime import datetime, time
+from itertools import groupby
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import TSVECTOR, aggregate_order_by
+from sqlalchemy.orm import backref, deferred, selectinload
+
+import facets
+import geo
+import images
+import search
+from cache import cache
+from database import RoutingSQLAlchemy, after_commit
+from enums import DaysOfWeek
+from pagination import paginate
 
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import or_
-from sqlalchemy.orm import backref
+db = RoutingSQLAlchemy(session_options={"expire_on_commit": False})
 
-from enums import DaysOfWeek
+log = logging.getLogger('fyyur.models')
+
+SHOWS_PER_SECTION = 12
+
+RECENT_LIMIT = 10
+
+
+class PersistenceMixin:
+    """Writes shared by all models.
+
+    They only flush: the surrounding unit of work (``db.transactional`` or
+    ``db.unit_of_work``) commits once, after which the page cache entries
+    named by ``cache_tags`` are invalidated and the ``image_links`` are
+    queued for thumbnailing.
+    """
+
+    def cache_tags(self):
+        return []
+
+    def image_links(self):
+        return []
+
+    def save(self):
+        db.session.add(self)
+        self._flush()
+
+    def update(self):
+        self._flush()
+
+    @classmethod
+    def delete(cls, id):
+        instance = db.session.get(cls, id)
+        # Taken before the delete, while the rows that relate pages still exist.
+        tags = instance.cache_tags()
+
+        db.session.delete(instance)
+        instance._flush(tags)
+
+    def _flush(self, tags=None):
+        try:
+            db.session.flush()
+        except:
+            db.session.rollback()
+            log.exception('Could not flush %s', type(self).__name__)
+
+            raise
+
+        tags = self.cache_tags() if tags is None else tags
+        links = self.image_links()
+
+        if tags:
+            after_commit(db.session, lambda: cache.invalidate(*tags))
+        if links:
+            after_commit(db.session, lambda: images.pipeline.submit(links, tags))
+
+
+class ProjectionMixin:
+    """Named column subsets of a model, queried as plain rows.
+
+    ``projections`` maps a profile to the columns a page reads, so pages that
+    never need the whole row do not load it. ``recent`` and ``nearby`` return
+    the ``listing`` and ``nearby`` profiles.
+    """
+
+    projections = {}
+
+    @classmethod
+    def projection(cls, profile):
+        return db.session.query(*[getattr(cls, column) for column in cls.projections[profile]])
 
-db = SQLAlchemy(session_options={"expire_on_commit": False})
+    @classmethod
+    def recent(cls, limit=RECENT_LIMIT):
+        return cls.projection('listing') \
+            .order_by(cls.created_at.desc(), cls.id.desc()) \
+            .limit(limit) \
+            .all()
+
+    @classmethod
+    def search(cls, search_term, criteria=()):
+        return search.search(db.session, cls, search_term or '', criteria=criteria)
+
+    @classmethod
+    def nearby(cls, latitude, longitude, radius_km=None, limit=geo.NEAREST_LIMIT):
+        return geo.nearby(cls.projection('nearby'), cls, latitude, longitude, radius_km, limit)
 
 
-class Venue(db.Model):
+class FacetMixin:
+    """Genre and state filters of a model with ``genres`` and ``state`` columns; see facets.py."""
+
+    @classmethod
+    def criteria(cls, genres=(), match='all', state=None):
+        criteria = facets.genre_criteria(db.session, cls.genres, genres, match)
+
+        if state:
+            criteria.append(cls.state == state)
+
+        return criteria
+
+    @classmethod
+    def genre_facets(cls, criteria=()):
+        return facets.genre_counts(db.session, cls, criteria)
+
+
+class Venue(FacetMixin, ProjectionMixin, PersistenceMixin, db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_created_at_id', db.text('created_at DESC'), db.text('id DESC')),
+        db.Index('ix_venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_geohash', 'geohash', postgresql_ops={'geohash': 'varchar_pattern_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     address = db.Column(db.String(120))
     city = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(db.ARRAY(db.String).with_variant(db.JSON, 'sqlite'))
     image_link = db.Column(db.String(500))
     name = db.Column(db.String)
     phone = db.Column(db.String(120))
@@ -25,73 +142,71 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     website = db.Column(db.String(120))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    search_vector = deferred(db.Column(TSVECTOR().with_variant(db.Text, 'sqlite')))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # Geocoded from city and state on save; see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+
+    # Rows are plain named tuples rather than mapped instances; the detail
+    # and edit pages load the instance through ``get``.
+    projections = {
+        'listing': ('id', 'name', 'created_at'),
+        'card': ('id', 'name', 'city', 'state', 'upcoming_shows_count'),
+        'nearby': ('id', 'name', 'city', 'state', 'latitude', 'longitude'),
+    }
 
     @classmethod
     def get(cls, venue_id):
         return cls.query \
             .filter_by(id=venue_id) \
-            .join(Show, Show.venue_id == cls.id, isouter=True) \
             .first()
 
     @classmethod
-    def list(cls):
-        return cls.query.all()
+    def list(cls, after=None, before=None, criteria=()):
+        return paginate(cls.projection('listing').filter(*criteria),
+                        [cls.created_at, cls.id],
+                        after=after,
+                        before=before)
 
     @classmethod
-    def search(cls, search_term):
-        return cls.query \
-            .add_columns(Venue.id, Venue.name) \
-            .filter(or_(Venue.name.ilike(f'%{search_term}%'),
-                        Venue.city.ilike(f'%{search_term}%'),
-                        Venue.state.ilike(f'%{search_term}%'))) \
-            .all()
-
-    def save(self):
-        try:
-            db.session.add(self)
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
+    def areas(cls, after=None, before=None, criteria=()):
+        page = paginate(cls.projection('card').filter(*criteria),
+                        [cls.state, cls.city, cls.name, cls.id],
+                        after=after,
+                        before=before)
 
-            raise
-        finally:
-            db.session.close()
-
-    def update(self):
-        try:
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
-
-            raise
-        finally:
-            db.session.close()
+        return page._replace(items=[
+            {'city': city, 'state': state, 'venues': list(venues)}
+            for (state, city), venues in groupby(page.items, key=lambda v: (v.state, v.city))
+        ])
 
-    @classmethod
-    def delete(cls, venue_id):
-        try:
-            venue = Venue.query.get(venue_id)
+    def cache_tags(self):
+        # Artist pages show the venue of each of their shows.
+        artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == self.id).distinct()
 
-            db.session.delete(venue)
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
+        return ['venues', f'venue:{self.id}', *[f'artist:{artist_id}' for artist_id, in artist_ids]]
 
-            raise
-        finally:
-            db.session.close()
+    def image_links(self):
+        return [self.image_link]
 
 
-class Artist(db.Model):
+class Artist(FacetMixin, ProjectionMixin, PersistenceMixin, db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_created_at_id', db.text('created_at DESC'), db.text('id DESC')),
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_state', 'state'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_geohash', 'geohash', postgresql_ops={'geohash': 'varchar_pattern_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String)
     albums = db.relationship('Album', backref='artist')
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(db.ARRAY(db.String).with_variant(db.JSON, 'sqlite'))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -101,54 +216,52 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, server_default='false')
     seeking_description = db.Column(db.String)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    search_vector = deferred(db.Column(TSVECTOR().with_variant(db.Text, 'sqlite')))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # Geocoded from city and state on save; see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
     available_schedules = db.relationship('ArtistSchedule', backref='artist')
 
-    def save(self):
-        try:
-            db.session.add(self)
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
+    projections = {
+        'listing': ('id', 'name', 'upcoming_shows_count'),
+        'nearby': ('id', 'name', 'city', 'state', 'latitude', 'longitude'),
+    }
 
-            raise
-        finally:
-            db.session.close()
+    @classmethod
+    def loader_options(cls, profile):
+        return {
+            'detail': [selectinload(cls.available_schedules)],
+            'edit': [selectinload(cls.available_schedules)],
+        }.get(profile, [])
 
     @classmethod
-    def get(cls, id):
+    def get(cls, id, profile=None):
         return cls.query \
+            .options(*cls.loader_options(profile)) \
             .filter_by(id=id) \
-            .join(Show, Show.artist_id == Artist.id, isouter=True) \
             .first()
 
     @classmethod
-    def list(cls):
-        return cls.query.values(Artist.id, Artist.name)
+    def list(cls, after=None, before=None, criteria=()):
+        return paginate(cls.projection('listing').filter(*criteria),
+                        [cls.name, cls.id],
+                        after=after,
+                        before=before)
 
-    @classmethod
-    def search(cls, search_term):
-        return cls.query \
-            .join(Show, cls.id == Show.artist_id, isouter=True) \
-            .add_columns(cls.id, cls.name) \
-            .filter(or_(cls.name.ilike(f'%{search_term}%'),
-                        cls.city.ilike(f'%{search_term}%'),
-                        cls.state.ilike(f'%{search_term}%'))) \
-            .all()
+    def cache_tags(self):
+        # Venue pages show the artist of each of their shows.
+        venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == self.id).distinct()
 
-    def update(cls):
-        try:
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
+        return ['artists', f'artist:{self.id}', *[f'venue:{venue_id}' for venue_id, in venue_ids]]
 
-            raise
-        finally:
-            db.session.close()
+    def image_links(self):
+        return [self.image_link]
 
 
-class ArtistSchedule(db.Model):
+class ArtistSchedule(PersistenceMixin, db.Model):
     __tablename__ = 'artist_schedule'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -158,36 +271,94 @@ class ArtistSchedule(db.Model):
     day_of_week = db.Column(db.Enum(DaysOfWeek,
                                     values_callable=lambda obj: [key.value for key in obj]))
     available = db.Column(db.Boolean(), nullable=False, default=True)
-    start_time = db.Column(db.Time, nullable=True, default='09:00:00')
-    end_time = db.Column(db.Time, nullable=True, default='23:59:59')
+    start_time = db.Column(db.Time, nullable=True, default=time(9))
+    end_time = db.Column(db.Time, nullable=True, default=time(23, 59, 59))
 
+    def cache_tags(self):
+        return [f'artist:{self.artist_id}']
 
-class Album(db.Model):
+
+class Album(PersistenceMixin, db.Model):
     __tablename__ = 'album'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False, index=True)
     title = db.Column(db.String, nullable=False)
     cover = db.Column(db.String, nullable=False)
     songs = db.relationship('Song', backref='album')
 
+    def cache_tags(self):
+        return [f'artist:{self.artist_id}']
 
-class Song(db.Model):
+    def image_links(self):
+        return [self.cover]
+
+    @classmethod
+    def catalogue(cls, artist_id):
+        """An artist's albums, each with the titles of its songs, in one query."""
+        if db.session.get_bind().dialect.name == 'postgresql':
+            songs = db.func.coalesce(
+                db.select(db.func.array_agg(aggregate_order_by(Song.title, Song.id)))
+                .where(Song.album_id == cls.id)
+                .scalar_subquery(),
+                db.cast([], db.ARRAY(db.String)))
+        else:
+            # SQLite aggregates rows in the order the subquery returns them.
+            titles = db.select(Song.title) \
+                .where(Song.album_id == cls.id) \
+                .order_by(Song.id) \
+                .correlate(cls) \
+                .subquery()
+            songs = db.type_coerce(
+                db.select(db.func.json_group_array(titles.c.title)).scalar_subquery(),
+                db.JSON)
+
+        return db.session.query(cls.id, cls.title, cls.cover, songs.label('songs')) \
+            .filter(cls.artist_id == artist_id) \
+            .order_by(cls.id) \
+            .all()
+
+
+class Song(PersistenceMixin, db.Model):
     __tablename__ = 'song'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    album_id = db.Column(db.Integer, db.ForeignKey('album.id'), nullable=False)
+    album_id = db.Column(db.Integer, db.ForeignKey('album.id'), nullable=False, index=True)
     title = db.Column(db.String, nullable=False)
 
 
-class Show(db.Model):
+search.track(Venue)
+search.track(Artist)
+geo.track(Venue)
+geo.track(Artist)
+
+
+class Show(PersistenceMixin, db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time', 'id'),
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time', 'id'),
+        # Only shows still counted as upcoming; these stay small however many
+        # past shows pile up.
+        db.Index('ix_show_uncounted_start_time', 'start_time',
+                 postgresql_where=db.text('NOT counted_as_past')),
+        db.Index('ix_show_uncounted_artist_id_start_time', 'artist_id', 'start_time',
+                 postgresql_where=db.text('NOT counted_as_past')),
+        db.Index('ix_show_uncounted_venue_id_start_time', 'venue_id', 'start_time',
+                 postgresql_where=db.text('NOT counted_as_past')),
+        db.Index('ix_show_idempotency_key', 'idempotency_key', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     name = db.Column(db.String(), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # Which of the artist and venue counters this show is included in; see stats.py.
+    counted_as_past = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    # From the hidden field of the booking form, so a resubmitted form books once.
+    idempotency_key = db.Column(db.String(64))
     artist = db.relationship(
         'Artist',
         cascade='all,delete',
@@ -201,20 +372,106 @@ class Show(db.Model):
         lazy='joined',
     )
 
-    def save(self):
-        try:
-            db.session.add(self)
-            db.session.commit()
-        except:
-            db.session.rollback()
-            print(sys.exc_info())
+    def cache_tags(self):
+        # The listings show upcoming counts, so they change with every show;
+        # of the detail pages only the show's artist and venue do.
+        return ['shows', 'artists', 'venues', f'artist:{self.artist_id}', f'venue:{self.venue_id}']
 
-            raise
-        finally:
-            db.session.close()
+    @classmethod
+    def list(cls, after=None, before=None):
+        return paginate(cls.cards(), [cls.start_time, cls.id], after=after, before=before)
+
+    @classmethod
+    def _criteria(cls, filters):
+        return [getattr(cls, column) == value for column, value in filters.items()]
+
+    @classmethod
+    def cards(cls, **filters):
+        return db.session.query(cls.id,
+                                cls.start_time,
+                                cls.artist_id,
+                                Artist.name.label('artist_name'),
+                                Artist.image_link.label('artist_image_link'),
+                                cls.venue_id,
+                                Venue.name.label('venue_name'),
+                                Venue.image_link.label('venue_image_link')) \
+            .join(Artist, Artist.id == cls.artist_id) \
+            .join(Venue, Venue.id == cls.venue_id) \
+            .filter(*cls._criteria(filters))
+
+    @classmethod
+    def upcoming(cls, now, limit=SHOWS_PER_SECTION, **filters):
+        return cls.cards(**filters) \
+            .filter(cls.start_time >= now) \
+            .order_by(cls.start_time, cls.id) \
+            .limit(limit) \
+            .all()
+
+    @classmethod
+    def past(cls, now, limit=SHOWS_PER_SECTION, **filters):
+        return cls.cards(**filters) \
+            .filter(cls.start_time < now) \
+            .order_by(cls.start_time.desc(), cls.id.desc()) \
+            .limit(limit) \
+            .all()
 
     @classmethod
-    def list(cls):
-        return Show.query \
-            .join(Artist, Artist.id == Show.artist_id) \
-            .join(Venue, Venue.id == Show.venue_id)
+    def nearby(cls, now, latitude, longitude, radius_km=geo.DEFAULT_RADIUS_KM, limit=SHOWS_PER_SECTION):
+        """Upcoming shows at venues within ``radius_km``, and ``{venue_id: distance_km}``."""
+        distances = {venue.id: distance
+                     for venue, distance in Venue.nearby(latitude, longitude, radius_km, limit=None)}
+
+        if not distances:
+            return [], distances
+
+        shows = cls.cards() \
+            .filter(cls.venue_id.in_(list(distances)), cls.start_time >= now) \
+            .order_by(cls.start_time, cls.id) \
+            .limit(limit) \
+            .all()
+
+        return shows, distances
+
+    @classmethod
+    def counts(cls, now, **filters):
+        """Upcoming and past counts of one artist or venue, from its counters.
+
+        Shows that started since the counters were last rolled forward are
+        moved from upcoming to past here, through the small partial indexes
+        on uncounted shows.
+        """
+        model = Artist if 'artist_id' in filters else Venue
+        started = db.session.query(db.func.count(cls.id)) \
+            .filter(*cls._criteria(filters),
+                    cls.counted_as_past.is_(False),
+                    cls.start_time < now) \
+            .scalar_subquery()
+
+        return db.session.query((model.upcoming_shows_count - started).label('upcoming'),
+                                (model.past_shows_count + started).label('past')) \
+            .filter(model.id == next(iter(filters.values()))) \
+            .one()
+
+
+def _count_show(connection, show, delta):
+    column = 'past_shows_count' if show.counted_as_past else 'upcoming_shows_count'
+
+    for model, entity_id in [(Artist, show.artist_id), (Venue, show.venue_id)]:
+        connection.execute(db.update(model.__table__)
+                           .where(model.__table__.c.id == entity_id)
+                           .values({column: model.__table__.c[column] + delta}))
+
+
+@event.listens_for(Show, 'before_insert')
+def _classify_show(mapper, connection, show):
+    show.counted_as_past = show.start_time < datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def _increment_show_counts(mapper, connection, show):
+    _count_show(connection, show, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def _decrement_show_counts(mapper, connection, show):
+    _count_show(connection, show, -1)
@@ -0,0 +1,85 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+PER_PAGE = 50
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(values):
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+
+    python_type = column.type.python_type
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+
+    if not isinstance(value, python_type):
+        raise TypeError(f'{column.key} cursor value {value!r} is not {python_type.__name__}')
+
+    return value
+
+
+def decode_cursor(cursor, columns):
+    """The key values in ``cursor``; ``None`` for anything a previous page did not produce."""
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate(query, columns, after=None, before=None, per_page=PER_PAGE):
+    """Keyset pagination over ``columns``, which must end with a unique column.
+
+    ``after``/``before`` are opaque cursors produced by a previous page, so each
+    page is an index range scan no matter how deep into the listing it is.
+    """
+    key = tuple_(*columns)
+    before_values = decode_cursor(before, columns) if before else None
+    after_values = decode_cursor(after, columns) if after else None
+
+    if before_values is not None:
+        rows = query \
+            .filter(key < tuple_(*before_values)) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(per_page + 1) \
+            .all()
+
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after_values is not None:
+            query = query.filter(key > tuple_(*after_values))
+
+        rows = query \
+            .order_by(*columns) \
+            .limit(per_page + 1) \
+            .all()
+
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after_values is not None
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    return Page(items=rows,
+                next_cursor=cursor_for(rows[-1]) if rows and has_next else None,
+                prev_cursor=cursor_for(rows[0]) if rows and has_prev else None)
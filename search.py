@@ -0,0 +1,175 @@
+import re
+from collections import defaultdict
+
+from sqlalchemy import event, func, or_
+
+SEARCH_LIMIT = 50
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Field weights, mirroring the setweight() labels used by the tsvector triggers.
+_WEIGHTS = (('name', 3), ('city', 2), ('state', 2), ('genres', 1))
+
+
+def escape_like(term):
+    """``term`` with LIKE wildcards escaped, for use with ``escape='\\'``."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_pattern(term):
+    return f'%{escape_like(term)}%'
+
+
+def ranked_search(session, model, search_term, limit=SEARCH_LIMIT, criteria=()):
+    """Ranked search backed by the ``search_vector`` and trigram GIN indexes."""
+    pattern = _like_pattern(search_term)
+    tsquery = func.plainto_tsquery('simple', search_term)
+    rank = func.ts_rank_cd(model.search_vector, tsquery) + func.similarity(model.name, search_term)
+
+    return session.query(model.id, model.name) \
+        .filter(or_(model.search_vector.op('@@')(tsquery),
+                    model.name.ilike(pattern, escape='\\'),
+                    model.city.ilike(pattern, escape='\\'),
+                    model.state.ilike(pattern, escape='\\')),
+                *criteria) \
+        .order_by(rank.desc(), model.name, model.id) \
+        .limit(limit) \
+        .all()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """In-process trigram index used when the database is not PostgreSQL."""
+
+    def __init__(self):
+        self._documents = {}
+        self._postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, id, name=None, city=None, state=None, genres=None):
+        self.remove(id)
+
+        fields = {
+            'name': (name or '').lower(),
+            'city': (city or '').lower(),
+            'state': (state or '').lower(),
+            'genres': ' '.join(genres or []).lower(),
+        }
+        self._documents[id] = (name or '', fields)
+
+        for text in fields.values():
+            for gram in _trigrams(text):
+                self._postings[gram].add(id)
+
+    def remove(self, id):
+        document = self._documents.pop(id, None)
+
+        if document is None:
+            return
+
+        for text in document[1].values():
+            for gram in _trigrams(text):
+                self._postings[gram].discard(id)
+
+    def search(self, search_term, limit=SEARCH_LIMIT):
+        term = (search_term or '').strip().lower()
+        words = _WORD.findall(term)
+
+        candidates = None
+
+        for word in words:
+            if len(word) < 3:
+                continue
+
+            for gram in _trigrams(word):
+                postings = self._postings.get(gram, set())
+                candidates = postings.copy() if candidates is None else candidates & postings
+
+        if candidates is None:
+            candidates = set(self._documents)
+
+        scored = []
+
+        for id in candidates:
+            name, fields = self._documents[id]
+            score = 0
+
+            for field, weight in _WEIGHTS:
+                text = fields[field]
+
+                if term in text:
+                    score += weight * (2 if text.startswith(term) else 1)
+                elif words and all(word in text for word in words):
+                    score += weight
+
+            if not score and words and all(any(word in text for text in fields.values()) for word in words):
+                score = 1
+
+            if score:
+                scored.append((-score, name.lower(), id))
+
+        scored.sort()
+
+        return [id for _, _, id in scored[:limit]]
+
+
+_indexes = {}
+
+
+def fallback_index(session, model):
+    index = _indexes.get(model)
+
+    if index is None:
+        index = SearchIndex()
+
+        for row in session.query(model.id, model.name, model.city, model.state, model.genres):
+            index.add(*row)
+
+        _indexes[model] = index
+
+    return index
+
+
+def fallback_search(session, model, search_term, limit=SEARCH_LIMIT, criteria=()):
+    # Filters apply to the best ``limit`` matches, so a filtered search may return fewer.
+    ids = fallback_index(session, model).search(search_term, limit)
+
+    if not ids:
+        return []
+
+    rows = {row.id: row for row in session.query(model.id, model.name).filter(model.id.in_(ids), *criteria)}
+
+    return [rows[id] for id in ids if id in rows]
+
+
+def search(session, model, search_term, limit=SEARCH_LIMIT, criteria=()):
+    if session.get_bind().dialect.name == 'postgresql':
+        return ranked_search(session, model, search_term, limit, criteria)
+
+    return fallback_search(session, model, search_term, limit, criteria)
+
+
+def track(model):
+    """Keep the in-process fallback index of ``model`` in sync with writes."""
+
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_update')
+    def index_document(mapper, connection, target):
+        index = _indexes.get(model)
+
+        if index is not None:
+            index.add(target.id, target.name, target.city, target.state, target.genres)
+
+    @event.listens_for(model, 'after_delete')
+    def remove_document(mapper, connection, target):
+        index = _indexes.get(model)
+
+        if index is not None:
+            index.remove(target.id)
+
+    return model
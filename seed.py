@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import random
+from datetime import datetime, time, timedelta
+
+from faker import Faker
+
+import geo
+from enums import DaysOfWeek, Genre
+
+BATCH_SIZE = 10000
+
+SIZES = {
+    'small': {'artists': 100, 'venues': 30, 'shows': 300, 'albums': 300},
+    'medium': {'artists': 10000, 'venues': 3000, 'shows': 100000, 'albums': 30000},
+    'large': {'artists': 100000, 'venues': 30000, 'shows': 2000000, 'albums': 300000},
+}
+
+GENRES = [genre.value for genre in Genre]
+
+# Faker is far too slow to call per row for millions of shows and songs, so
+# free text is drawn from a pool generated once per run.
+TEXT_POOL_SIZE = 2000
+
+
+def _array(values):
+    return '{' + ','.join('"' + value.replace('"', '\\"') + '"' for value in values) + '}'
+
+
+def _copy(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+
+    for row in rows:
+        writer.writerow([_array(value) if isinstance(value, list) else value for value in row])
+        count += 1
+
+        if count % BATCH_SIZE == 0:
+            _flush_copy(cursor, table, columns, buffer)
+            buffer.seek(0)
+            buffer.truncate()
+
+    _flush_copy(cursor, table, columns, buffer)
+
+    return count
+
+
+def _flush_copy(cursor, table, columns, buffer):
+    if not buffer.tell():
+        return
+
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _sqlite_value(value):
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(value, time):
+        return value.strftime('%H:%M:%S.%f')
+
+    return value
+
+
+def _insert(cursor, table, columns, rows):
+    """Fallback for drivers without COPY, e.g. sqlite3."""
+    statement = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    batch = []
+    count = 0
+
+    for row in rows:
+        batch.append([_sqlite_value(value) for value in row])
+        count += 1
+
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(statement, batch)
+            batch = []
+
+    if batch:
+        cursor.executemany(statement, batch)
+
+    return count
+
+
+class Generator:
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+        self.sentences = [self.fake.sentence() for _ in range(TEXT_POOL_SIZE)]
+        self.titles = [self.fake.text(max_nb_chars=20) for _ in range(TEXT_POOL_SIZE)]
+        # Places come from the gazetteer, so proximity searches find neighbours.
+        self.places = geo.cities()
+        self.now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def genres(self):
+        return self.random.sample(GENRES, k=self.random.choice([1, 2, 3]))
+
+    def place(self):
+        city, state, latitude, longitude = self.random.choice(self.places)
+
+        return city, state, latitude, longitude, geo.encode(latitude, longitude)
+
+    def artists(self, first_id, count):
+        for artist_id in range(first_id, first_id + count):
+            seeking_venue = self.random.random() < 0.5
+            city, state, latitude, longitude, geohash = self.place()
+
+            yield (
+                artist_id,
+                '[A] ' + self.fake.name(),
+                self.genres(),
+                city,
+                state,
+                self.fake.numerify('###-###-####'),
+                self.fake.hostname(),
+                'https://source.unsplash.com/300x200/?singer',
+                'https://www.facebook.com/' + self.fake.user_name(),
+                seeking_venue,
+                self.random.choice(self.sentences) if seeking_venue else None,
+                latitude,
+                longitude,
+                geohash,
+            )
+
+    def schedules(self, first_id, count):
+        for artist_id in range(first_id, first_id + count):
+            for day in DaysOfWeek:
+                if self.random.random() < 0.5:
+                    start = self.random.randrange(9, 22)
+                    end = self.random.randrange(start + 1, 24)
+
+                    yield artist_id, day.value, True, time(start), time(end - 1, 59)
+                else:
+                    yield artist_id, day.value, False, None, None
+
+    def venues(self, first_id, count):
+        for venue_id in range(first_id, first_id + count):
+            city, state, latitude, longitude, geohash = self.place()
+
+            yield (
+                venue_id,
+                '[V] ' + self.fake.company(),
+                self.fake.street_address(),
+                city,
+                'https://www.facebook.com/' + self.fake.user_name(),
+                self.genres(),
+                'https://source.unsplash.com/400x600/?concert',
+                self.fake.numerify('###-###-####'),
+                self.random.choice(self.sentences),
+                self.random.random() < 0.5,
+                state,
+                self.fake.hostname(),
+                latitude,
+                longitude,
+                geohash,
+            )
+
+    def shows(self, artist_ids, venue_ids, count):
+        for _ in range(count):
+            yield (
+                self.random.randrange(*artist_ids),
+                self.random.randrange(*venue_ids),
+                '[S] ' + self.random.choice(self.sentences),
+                self.now + timedelta(hours=self.random.randrange(-100 * 24, 100 * 24)),
+            )
+
+    def albums(self, first_id, artist_ids, count):
+        for album_id in range(first_id, first_id + count):
+            yield album_id, self.random.randrange(*artist_ids), self.random.choice(self.titles), \
+                'https://source.unsplash.com/400x600/?music'
+
+    def songs(self, album_ids):
+        for album_id in range(*album_ids):
+            for _ in range(self.random.randrange(5, 15)):
+                yield album_id, self.random.choice(self.titles)
+
+
+def _next_id(cursor, table):
+    cursor.execute(f'SELECT coalesce(max(id), 0) + 1 FROM {table}')
+
+    return cursor.fetchone()[0]
+
+
+def _reset_sequence(cursor, table):
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+
+
+def seed(engine, size='small', seed=None, echo=print):
+    """Bulk-load a generated dataset; the same ``seed`` yields the same data."""
+    counts = SIZES[size]
+    generator = Generator(seed)
+    connection = engine.raw_connection()
+    postgres = engine.dialect.name == 'postgresql'
+    load = _copy if postgres else _insert
+
+    try:
+        cursor = connection.cursor()
+
+        first_artist = _next_id(cursor, 'artist')
+        first_venue = _next_id(cursor, 'venue')
+        first_album = _next_id(cursor, 'album')
+        artist_ids = (first_artist, first_artist + counts['artists'])
+        venue_ids = (first_venue, first_venue + counts['venues'])
+        album_ids = (first_album, first_album + counts['albums'])
+
+        steps = [
+            ('artist',
+             ['id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'image_link', 'facebook_link',
+              'seeking_venue', 'seeking_description', 'latitude', 'longitude', 'geohash'],
+             generator.artists(first_artist, counts['artists'])),
+            ('artist_schedule',
+             ['artist_id', 'day_of_week', 'available', 'start_time', 'end_time'],
+             generator.schedules(first_artist, counts['artists'])),
+            ('venue',
+             ['id', 'name', 'address', 'city', 'facebook_link', 'genres', 'image_link', 'phone',
+              'seeking_description', 'seeking_talent', 'state', 'website', 'latitude', 'longitude', 'geohash'],
+             generator.venues(first_venue, counts['venues'])),
+            ('show',
+             ['artist_id', 'venue_id', 'name', 'start_time'],
+             generator.shows(artist_ids, venue_ids, counts['shows'])),
+            ('album',
+             ['id', 'artist_id', 'title', 'cover'],
+             generator.albums(first_album, artist_ids, counts['albums'])),
+            ('song',
+             ['album_id', 'title'],
+             generator.songs(album_ids)),
+        ]
+
+        for table, columns, rows in steps:
+            count = load(cursor, table, columns, rows)
+
+            if postgres and 'id' in columns:
+                _reset_sequence(cursor, table)
+
+            connection.commit()
+            echo(f'{table}: {count} rows')
+    except:
+        connection.rollback()
+
+        raise
+    finally:
+        connection.close()
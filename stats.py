@@ -0,0 +1,59 @@
+from collections import Counter
+
+from sqlalchemy import bindparam
+
+from models import db, Artist, Show, Venue
+
+# Each show is counted once, in either the upcoming or the past counter of
+# its artist and its venue, as recorded by Show.counted_as_past. Inserts and
+# deletes adjust the counters as they flush; shows that start later move
+# from upcoming to past when the counters are rolled forward.
+
+
+def _shift(model, moved):
+    if not moved:
+        return
+
+    table = model.__table__
+    db.session.execute(table.update()
+                       .where(table.c.id == bindparam('entity_id'))
+                       .values(upcoming_shows_count=table.c.upcoming_shows_count - bindparam('moved'),
+                               past_shows_count=table.c.past_shows_count + bindparam('moved')),
+                       [{'entity_id': entity_id, 'moved': count} for entity_id, count in moved.items()])
+
+
+def roll_show_counts(now):
+    """Move the shows that started before ``now`` into the past counters.
+
+    Only reads shows still counted as upcoming, through a partial index, and
+    locks them so that concurrent runs never move the same show twice.
+    """
+    started = db.session.query(Show.id, Show.artist_id, Show.venue_id) \
+        .filter(Show.counted_as_past.is_(False), Show.start_time < now) \
+        .with_for_update(skip_locked=True) \
+        .all()
+
+    if not started:
+        return started
+
+    _shift(Artist, Counter(show.artist_id for show in started))
+    _shift(Venue, Counter(show.venue_id for show in started))
+
+    db.session.query(Show) \
+        .filter(Show.id.in_([show.id for show in started])) \
+        .update({Show.counted_as_past: True}, synchronize_session=False)
+
+    return started
+
+
+def rebuild_show_counts(now):
+    """Recompute every counter from the show table, e.g. after a bulk load."""
+    db.session.query(Show).update({Show.counted_as_past: Show.start_time < now}, synchronize_session=False)
+
+    for model, column in [(Artist, Show.artist_id), (Venue, Show.venue_id)]:
+        shows = db.session.query(db.func.count(Show.id)).filter(column == model.id)
+
+        db.session.query(model).update({
+            model.upcoming_shows_count: shows.filter(Show.start_time >= now).scalar_subquery(),
+            model.past_shows_count: shows.filter(Show.start_time < now).scalar_subquery(),
+        }, synchronize_session=False)
@@ -0,0 +1,34 @@
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def template_names(app):
+    return app.jinja_env.list_templates(extensions=['html'])
+
+
+def compile_templates(app):
+    """Compile every template, filling the bytecode cache when one is set."""
+    for name in template_names(app):
+        app.jinja_env.get_template(name)
+
+    return len(template_names(app))
+
+
+def configure_templates(app):
+    """Production template mode: no reload checks, bytecode cache, warmed at start.
+
+    With the cache filled at build time (``flask compile-templates``), the
+    warm-up only unmarshals bytecode, so no request pays for compilation.
+    """
+    if not app.config.get('TEMPLATES_PRECOMPILED'):
+        return
+
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    app.jinja_env.auto_reload = False
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    compile_templates(app)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+
+# The app reads its configuration on import, so point it at a scratch SQLite
+# database before anything imports it.
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='fyyur-tests-'), 'test.db')
+
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_PATH}'
+os.environ.setdefault('CACHE_ENABLED', 'false')
+os.environ.setdefault('IMAGE_PIPELINE_ENABLED', 'false')
+os.environ.setdefault('SLOW_QUERY_MS', '100000')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from models import db
+    from seed import seed
+    from stats import rebuild_show_counts
+
+    with app.app_context():
+        db.create_all()
+        seed(db.engine, size='small', seed=1, echo=lambda message: None)
+
+        with db.unit_of_work():
+            rebuild_show_counts(datetime.now())
+
+        db.session.remove()
+
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
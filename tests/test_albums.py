@@ -0,0 +1,34 @@
+from models import db, Album, Song
+
+
+def artist_with_albums(app):
+    with app.app_context():
+        return db.session.query(Album.artist_id).join(Song, Song.album_id == Album.id).first()[0]
+
+
+def test_catalogue_lists_songs_in_id_order(app):
+    artist_id = artist_with_albums(app)
+
+    with app.app_context():
+        for album in Album.catalogue(artist_id):
+            titles = [title for title, in db.session.query(Song.title)
+                      .filter(Song.album_id == album.id)
+                      .order_by(Song.id)]
+
+            assert list(album.songs) == titles
+
+
+def test_albums_render_as_a_fragment_only_when_fetched(app, client):
+    artist_id = artist_with_albums(app)
+
+    page = client.get(f'/artists/{artist_id}/albums')
+    fragment = client.get(f'/artists/{artist_id}/albums?partial=1')
+
+    assert page.status_code == fragment.status_code == 200
+    assert b'<body' in page.data
+    assert b'<body' not in fragment.data
+    assert b'Album' in fragment.data
+
+
+def test_albums_of_a_missing_artist_are_not_found(client):
+    assert client.get('/artists/999999/albums').status_code == 404
@@ -0,0 +1,34 @@
+import os
+
+from flask import Flask
+
+from assets import BUNDLES, DIST, Assets, build
+
+
+def static_app(tmp_path):
+    for sources in BUNDLES.values():
+        for source in sources:
+            path = tmp_path / source
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f'/* {source} */')
+
+    return Flask(__name__, static_folder=str(tmp_path), static_url_path='/static')
+
+
+def test_sources_are_linked_until_a_build_exists(tmp_path):
+    app = static_app(tmp_path)
+    assets = Assets(app)
+
+    with app.test_request_context():
+        assert assets.urls('app.css') == [f'/static/{source}' for source in BUNDLES['app.css']]
+
+    assert not os.path.exists(tmp_path / DIST)
+
+
+def test_built_bundles_are_linked_by_their_hashed_names(tmp_path):
+    app = static_app(tmp_path)
+    manifest = build(app.static_folder)
+    assets = Assets(app)
+
+    with app.test_request_context():
+        assert assets.urls('app.css') == [f'/static/{DIST}/{manifest["app.css"]}']
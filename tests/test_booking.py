@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from benchmark import booking_fixtures
+from models import db, Show
+
+START_TIME = (date.today() + timedelta(days=3)).strftime('%Y-%m-%d 20:00:00')
+
+
+def show_form(artist_id, venue_id, **fields):
+    return {'artist_id': artist_id, 'venue_id': venue_id, 'name': '[S] Resubmitted',
+            'start_time': START_TIME, 'idempotency_key': 'resubmitted-form', **fields}
+
+
+def booked(app, artist_id):
+    with app.app_context():
+        return db.session.query(Show.start_time).filter(Show.artist_id == artist_id).all()
+
+
+def test_resubmitted_form_books_the_show_once(app, client):
+    with app.app_context():
+        (artist_id, venue_id), = booking_fixtures(count=1)
+
+    for _ in range(2):
+        response = client.post('/shows/create', data=show_form(artist_id, venue_id), follow_redirects=True)
+
+        assert b'successfully listed' in response.data
+
+    assert len(booked(app, artist_id)) == 1
+
+
+def test_reused_key_for_a_different_show_is_rejected(app, client):
+    with app.app_context():
+        (artist_id, venue_id), = booking_fixtures(count=1)
+
+    form = show_form(artist_id, venue_id, idempotency_key='reused-form')
+    client.post('/shows/create', data=form)
+
+    later = START_TIME.replace('20:00', '22:30')
+    response = client.post('/shows/create', data={**form, 'start_time': later})
+
+    assert response.status_code == 200
+    assert b'already booked a different show' in response.data
+    assert b'reused-form' not in response.data
+    assert len(booked(app, artist_id)) == 1
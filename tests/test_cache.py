@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache import LRUBackend, cache
+from models import db, Artist, Show, Venue
+from test_query_counts import counted_queries
+
+
+@pytest.fixture
+def cached(app, monkeypatch):
+    monkeypatch.setattr(cache, 'backend', LRUBackend())
+
+
+def fixtures(app):
+    """An artist with a show at one venue, and another venue with an unrelated show."""
+    with app.app_context(), db.unit_of_work():
+        artist, other_artist = [Artist(name=name, city='San Francisco', state='CA', phone='123-123-1234',
+                                       genres=['Jazz']) for name in ['[A] Tagged', '[A] Untagged']]
+        venue, other_venue = [Venue(name=name, city='San Francisco', state='CA', address='1015 Folsom Street',
+                                    phone='123-123-1234', genres=['Jazz']) for name in ['[V] Tagged', '[V] Untagged']]
+
+        for row in [artist, other_artist, venue, other_venue]:
+            row.save()
+
+        start_time = datetime.now() + timedelta(days=7)
+        Show(artist_id=artist.id, venue_id=venue.id, name='[S] Tagged', start_time=start_time).save()
+        Show(artist_id=other_artist.id, venue_id=other_venue.id, name='[S] Untagged', start_time=start_time).save()
+
+        return artist.id, other_artist.id, venue.id, other_venue.id
+
+
+def rendered(app, client, *urls):
+    """The URLs whose views ran, rather than being served from the cache."""
+    ran = []
+
+    for url in urls:
+        with counted_queries(db.get_engine(app)) as statements:
+            assert client.get(url).status_code == 200
+
+        if statements:
+            ran.append(url)
+
+    return ran
+
+
+def test_artist_write_invalidates_only_pages_showing_the_artist(app, client, cached):
+    artist_id, other_artist_id, venue_id, other_venue_id = fixtures(app)
+    pages = [f'/artists/{artist_id}', f'/venues/{venue_id}', f'/artists/{other_artist_id}', f'/venues/{other_venue_id}']
+    rendered(app, client, *pages)
+
+    assert rendered(app, client, *pages) == []
+
+    with app.app_context(), db.unit_of_work():
+        artist = db.session.get(Artist, artist_id)
+        artist.name = '[A] Renamed'
+        artist.update()
+
+    assert rendered(app, client, *pages) == pages[:2]
+    assert b'[A] Renamed' in client.get(f'/venues/{venue_id}').data
+
+
+def test_booking_invalidates_only_its_artist_and_venue_pages(app, client, cached):
+    artist_id, other_artist_id, venue_id, other_venue_id = fixtures(app)
+    pages = [f'/artists/{artist_id}', f'/venues/{other_venue_id}', f'/artists/{other_artist_id}', f'/venues/{venue_id}']
+    rendered(app, client, *pages)
+
+    with app.app_context(), db.unit_of_work():
+        Show(artist_id=artist_id, venue_id=other_venue_id, name='[S] Booked',
+             start_time=datetime.now() + timedelta(days=8)).save()
+
+    assert rendered(app, client, *pages) == pages[:2]
+
+
+def test_deleted_venue_invalidates_its_artists_pages(app, cached):
+    artist_id, other_artist_id, venue_id, _ = fixtures(app)
+    tags = [f'artist:{artist_id}', f'artist:{other_artist_id}']
+    before = cache._tag_versions(tags)
+
+    with app.app_context(), db.unit_of_work():
+        Venue.delete(venue_id)
+
+    after = cache._tag_versions(tags)
+
+    assert after[0] != before[0]
+    assert after[1] == before[1]
@@ -0,0 +1,74 @@
+import asyncio
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+from images import IMMUTABLE, ImagePipeline
+
+
+def png():
+    output = io.BytesIO()
+    Image.new('RGB', (800, 600), 'purple').save(output, 'PNG')
+
+    return output.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    body = png()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def image_url():
+    server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f'http://127.0.0.1:{server.server_port}/cover.png'
+
+    server.shutdown()
+    server.server_close()
+
+
+def image_app(tmp_path, allowed_hosts):
+    app = Flask(__name__)
+    app.config.update(IMAGE_STORE_DIR=str(tmp_path), IMAGE_ALLOWED_HOSTS=allowed_hosts)
+
+    return app, ImagePipeline(app)
+
+
+def test_allowed_host_is_stored_and_served_as_immutable(tmp_path, image_url):
+    app, pipeline = image_app(tmp_path, ['127.0.0.1'])
+
+    assert asyncio.run(pipeline.process([image_url])) == 1
+
+    with app.test_request_context():
+        thumbnail_url = pipeline.thumbnail_url(image_url)
+
+    assert thumbnail_url.startswith('/img/')
+
+    response = app.test_client().get(thumbnail_url)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['Cache-Control'] == IMMUTABLE
+    assert Image.open(io.BytesIO(response.data)).size == (400, 300)
+
+
+def test_loopback_host_is_refused_by_default(tmp_path, image_url):
+    app, pipeline = image_app(tmp_path, [])
+
+    assert asyncio.run(pipeline.process([image_url])) == 0
+    assert pipeline.store.lookup(image_url) is None
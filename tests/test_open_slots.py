@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+
+from benchmark import booking_fixtures
+from booking import SHOW_DURATION, free_windows, open_slots
+from models import db, Artist, Show
+
+DAY = date.today() + timedelta(days=30)
+
+
+def at(hour, minute=0):
+    return datetime.combine(DAY, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+
+
+def test_free_window_without_shows_is_the_whole_window():
+    assert free_windows(at(18), at(23), []) == [(at(18), at(23))]
+
+
+def test_shows_cut_gaps_out_of_the_window():
+    assert free_windows(at(10), at(20), [at(12), at(15)]) == [(at(10), at(12)), (at(17), at(20))]
+
+
+def test_gaps_shorter_than_a_show_are_dropped():
+    assert free_windows(at(10), at(15), [at(11), at(14)]) == []
+
+
+def test_shows_outside_the_window_still_block_its_edges():
+    # Started an hour before the window, so it ends an hour into it.
+    assert free_windows(at(10), at(14), [at(9), at(20)]) == [(at(11), at(14))]
+    assert free_windows(at(10), at(12), [at(12)]) == [(at(10), at(12))]
+
+
+def test_open_slots_leave_out_booked_shows(app):
+    with app.app_context():
+        (artist_id, venue_id), = booking_fixtures(count=1)
+
+        with db.unit_of_work():
+            Show(artist_id=artist_id, venue_id=venue_id, name='[S] Booked', start_time=at(12)).save()
+
+        slots = open_slots([artist_id], DAY, DAY)
+
+    assert [(slot['start_time'], slot['end_time']) for slot in slots] == \
+        [(at(0), at(12)), (at(12) + SHOW_DURATION, at(23, 59) + timedelta(seconds=59))]
+    assert all(slot['artist_id'] == artist_id for slot in slots)
+
+
+def test_open_slots_of_no_artists_is_empty(app):
+    with app.app_context():
+        assert open_slots([], DAY, DAY) == []
+
+
+def slots_of(client, **params):
+    response = client.get('/artists/open-slots', query_string={'from': DAY.isoformat(), 'to': DAY.isoformat(),
+                                                               **params})
+
+    assert response.status_code == 200
+
+    return response.json
+
+
+def test_genre_filter_uses_the_listing_criteria(app, client):
+    jazz = slots_of(client, genre='Jazz')
+
+    with app.app_context():
+        genres = db.session.query(Artist.genres) \
+            .filter(Artist.id.in_({slot['artist_id'] for slot in jazz['slots']})) \
+            .all()
+
+    assert jazz['slots']
+    assert all('Jazz' in artist_genres for artist_genres, in genres)
+
+
+def test_unknown_genres_are_ignored(client):
+    assert slots_of(client, genre='Not A Genre') == slots_of(client)
+
+
+def test_city_is_matched_literally(client):
+    assert slots_of(client, city='San Francisco')['slots']
+    assert slots_of(client, city='%')['slots'] == []
+
+
+def test_artists_are_paged(client):
+    first = slots_of(client)
+    second = slots_of(client, after=first['next'])
+
+    assert first['next']
+    assert not {slot['artist_id'] for slot in first['slots']} & {slot['artist_id'] for slot in second['slots']}
@@ -0,0 +1,34 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import datetime
+
+import pytest
+
+from models import Show
+from pagination import decode_cursor, encode_cursor
+
+
+def cursor(values):
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize('value', [
+    'not base64!',
+    cursor({'start_time': 1}),
+    cursor(['2026-13-45T00:00:00', 1]),
+    cursor([20261018, 1]),
+    cursor(['2026-10-18T20:00:00', 'one']),
+])
+def test_malformed_cursors_are_ignored(value):
+    assert decode_cursor(value, [Show.start_time, Show.id]) is None
+
+
+def test_cursors_round_trip():
+    values = [datetime(2026, 10, 18, 20), 7]
+
+    assert decode_cursor(encode_cursor(values), [Show.start_time, Show.id]) == values
+
+
+def test_listing_with_a_malformed_cursor_shows_the_first_page(client):
+    assert client.get('/shows?after=' + cursor([20261018, 1])).status_code == 200
+    assert client.get('/api/v1/shows?after=' + cursor(['yesterday', 1])).status_code == 200
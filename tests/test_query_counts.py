@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, func
+
+from models import db, Show
+
+# Detail pages read the row, its show counts and one page of upcoming and past
+# shows; artist pages also load the weekly schedule. None of it may grow with
+# the number of shows, albums or songs.
+MAX_ARTIST_QUERIES = 5
+MAX_VENUE_QUERIES = 4
+
+
+@contextmanager
+def counted_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def busiest(app, column):
+    with app.app_context():
+        return db.session.query(column) \
+            .group_by(column) \
+            .order_by(func.count().desc(), column) \
+            .limit(1) \
+            .scalar()
+
+
+@pytest.mark.parametrize('url, column, limit', [
+    ('/artists/{}', Show.artist_id, MAX_ARTIST_QUERIES),
+    ('/venues/{}', Show.venue_id, MAX_VENUE_QUERIES),
+])
+def test_detail_page_query_count(app, client, url, column, limit):
+    url = url.format(busiest(app, column))
+
+    # The first request warms up the connection and template caches.
+    client.get(url)
+
+    with app.app_context():
+        engine = db.get_engine(app)
+
+    with counted_queries(engine) as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(statements) <= limit, '\n\n'.join(statements)
@@ -0,0 +1,72 @@
+from models import db, Venue
+from search import SearchIndex
+
+VENUE = {'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street', 'phone': '123-123-1234',
+         'genres': ['Jazz']}
+
+
+def index_of(*documents):
+    index = SearchIndex()
+
+    for document in documents:
+        index.add(*document)
+
+    return index
+
+
+def test_name_prefix_outranks_name_match_outranks_other_fields():
+    index = index_of(
+        (1, 'The Blue Note', 'New York', 'NY', ['Jazz']),
+        (2, 'Blue Moon', 'Austin', 'TX', ['Rock']),
+        (3, 'Green Room', 'Portland', 'OR', ['Blues']),
+        (4, 'Red Rocks', 'Morrison', 'CO', ['Folk']),
+    )
+
+    assert index.search('blue') == [2, 1, 3]
+
+
+def test_ties_are_ordered_by_name():
+    index = index_of((1, 'Zebra Jazz Bar', '', '', []), (2, 'Alpha Jazz Bar', '', '', []))
+
+    assert index.search('jazz') == [2, 1]
+
+
+def test_every_word_must_match():
+    index = index_of((1, 'Blue Note', 'New York', 'NY', []), (2, 'Blue Moon', 'Austin', 'TX', []))
+
+    assert index.search('blue york') == [1]
+
+
+def test_results_are_limited():
+    index = index_of(*[(id, f'Jazz Club {id:02}', '', '', []) for id in range(1, 21)])
+
+    assert index.search('jazz', limit=5) == [1, 2, 3, 4, 5]
+    assert len(index.search('jazz')) == 20
+
+
+def names(search_term):
+    return [row.name for row in Venue.search(search_term)]
+
+
+def test_index_follows_inserts_updates_and_deletes(app):
+    with app.app_context():
+        # Builds the fallback index, so the writes below must keep it in sync.
+        names('Quixotic')
+
+        with db.unit_of_work():
+            venue = Venue(name='[V] Quixotic Hall', **VENUE)
+            venue.save()
+
+        assert names('Quixotic') == ['[V] Quixotic Hall']
+
+        with db.unit_of_work():
+            venue.name = '[V] Zanzibar Hall'
+            venue.update()
+
+        assert names('Quixotic') == []
+        assert names('Zanzibar') == ['[V] Zanzibar Hall']
+
+        with db.unit_of_work():
+            Venue.delete(venue.id)
+
+        assert names('Zanzibar') == []
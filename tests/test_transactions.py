@@ -0,0 +1,59 @@
+from sqlalchemy.exc import DBAPIError
+
+from models import db, Venue
+
+VENUE_FORM = {
+    'name': '[V] Retried Hall',
+    'city': 'San Francisco',
+    'state': 'CA',
+    'address': '1015 Folsom Street',
+    'phone': '123-123-1234',
+    'genres': ['Jazz'],
+}
+
+
+class SerializationFailure(Exception):
+    pgcode = '40001'
+
+
+def test_create_venue_is_retried_after_a_serialization_failure(app, client, monkeypatch):
+    save = Venue.save
+    attempts = []
+
+    def save_failing_once(venue):
+        attempts.append(venue.name)
+
+        if len(attempts) == 1:
+            raise DBAPIError('INSERT INTO venue', {}, SerializationFailure())
+
+        save(venue)
+
+    monkeypatch.setattr(Venue, 'save', save_failing_once)
+
+    response = client.post('/venues/create', data=VENUE_FORM, follow_redirects=True)
+
+    assert attempts == [VENUE_FORM['name']] * 2
+    assert b'successfully listed' in response.data
+    assert b'could not be listed' not in response.data
+
+    with app.app_context():
+        assert db.session.query(Venue.id).filter(Venue.name == VENUE_FORM['name']).count() == 1
+
+
+def test_other_database_errors_are_reported_without_retrying(app, client, monkeypatch, caplog):
+    attempts = []
+
+    def save_failing(venue):
+        attempts.append(venue.name)
+
+        raise DBAPIError('INSERT INTO venue', {}, Exception('boom'))
+
+    monkeypatch.setattr(Venue, 'save', save_failing)
+
+    response = client.post('/venues/create', data={**VENUE_FORM, 'name': '[V] Failed Hall'},
+                           follow_redirects=True)
+
+    assert len(attempts) == 1
+    assert b'could not be listed' in response.data
+    assert any(record.getMessage() == 'Could not create venue [V] Failed Hall' and record.exc_info
+               for record in caplog.records)